@@ -1,14 +1,13 @@
-from aiohttp import ClientSession
 from discord.ext.commands import BadArgument, Converter, errors
 
-import utils
-
-session = ClientSession()
+import accounts
 
 
 class IsMyNick(Converter):
     async def convert(self, ctx, nick: str) -> str:
-        if nick.replace('"', "").strip().lower() == utils.my_nick(ctx.channel.name).lower():
+        account = accounts.find(ctx.channel.name, nick)
+        if account is not None:
+            accounts.use(account)  # the command will run with this account
             return nick
         else:
             raise errors.CheckFailure
@@ -84,8 +83,8 @@ class Product(Converter):
 class Country(Converter):
     async def convert(self, ctx, country: str) -> int:
         if not country.isdigit():
-            api = await session.get(f"https://{ctx.channel.name}.e-sim.org/apiCountries.html")
-            country = next(x['id'] for x in await api.json(content_type=None) if x["name"].lower() == country.strip().lower())
+            api = await ctx.bot.get_content(f"https://{ctx.channel.name}.e-sim.org/apiCountries.html")
+            country = next(x['id'] for x in api if x["name"].lower() == country.strip().lower())
         return country
 
 
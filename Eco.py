@@ -1,13 +1,14 @@
-from asyncio import sleep
-from datetime import datetime, time, timedelta
+from asyncio import Semaphore, gather, sleep
+from datetime import datetime
 from random import uniform
 from typing import Optional
-import os
 
 from discord import Embed
 from discord.ext.commands import Cog, command
 from pytz import timezone
 
+from extractors import get_equipment
+from orderbook import OrderBook
 import utils
 from Converters import Bool, Country, Id, IsMyNick, Product, Quality
 
@@ -18,6 +19,58 @@ class Eco(Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def get_currency_ids(self, server) -> dict:
+        """{currency name: country id} (apiCountries is cached by get_content, see cache.API_TTL)"""
+        api = await self.bot.get_content(f"https://{server}.e-sim.org/apiCountries.html")
+        return {row["currencyName"]: row["id"] for row in api}
+
+    async def buy_coins(self, ctx, nick, link, amount, max_price=float("inf"), book=None):
+        """Buys `amount` coins from the monetary market (cheapest first, up to `max_price`).
+        The purchases are planned from the order book, which is fetched again only when it's empty or stale,
+        or when a purchase fails.
+        Returns (bought amount, order book for the next call), or None if the command was cancelled."""
+        bought = 0
+        fresh = False
+        for _ in range(10):  # max fetches
+            if bought >= amount:
+                break
+            if book is None or book.is_stale or not book:
+                book = OrderBook.from_tree(await self.bot.get_content(link, return_tree=True))
+                fresh = True
+            plan = book.plan(amount - bought, max_price)
+            if not plan:
+                if book:
+                    await ctx.send(f"**{nick}** The price is too high ({book.best_price}).")
+                else:
+                    await ctx.send(f"**{nick}** ERROR: there's no money in the monetary market")
+                break
+            failed = False
+            for ID, quantity, price, _ in plan:
+                if self.bot.should_break(ctx):
+                    return None
+                if book.is_stale:
+                    break
+                payload = {'action': "buy", 'id': ID, 'ammount': quantity, 'stockCompanyId': '', 'submit': 'Buy'}
+                try:
+                    url = await self.bot.get_content(link, data=payload)
+                except Exception as error:
+                    url = error
+                if "MM_POST_OK_BUY" not in str(url):
+                    await ctx.send(f"**{nick}** ERROR: <{url}>")
+                    failed = True
+                    break
+                fresh = False
+                book.fill(ID, quantity)
+                bought = round(bought + quantity, 2)
+                await ctx.send(f"**{nick}** Bought {quantity} coins at {price} each.")
+                await sleep(uniform(0, 2))
+                # sleeping for a random time between 0 and 2 seconds. feel free to change it
+            if failed:
+                if fresh:  # failed right after a fetch, so it's not an outdated offer
+                    break
+                book = None
+        return bought, book
+
     @command()
     async def contract(self, ctx, contract_id: Optional[Id] = 0, *, nick: IsMyNick):
         """Accept specific contract id.
@@ -51,7 +104,8 @@ class Eco(Cog):
         if delay:
             h, m, s = auction_time.split(":")
             delay_in_seconds = int(h) * 3600 + int(m) * 60 + int(s) - 30
-            await sleep(delay_in_seconds)
+            job_id = await self.bot.scheduler.add(ctx, "bid", auction, price, False, delay=delay_in_seconds, nick=nick)
+            return await ctx.send(f"**{nick}** I will bid in {delay_in_seconds} seconds (`.cancel {job_id} {nick}`).")
         if not self.bot.should_break(ctx):
             payload = {'action': "BID", 'id': auction, 'price': f"{float(price):.2f}"}
             url = await self.bot.get_content(URL + "auctionAction.html", data=payload)
@@ -62,41 +116,10 @@ class Eco(Cog):
         """Buying specific amount of coins, up to a pre-determined price.
         (It can help if there are many small offers, like NPC)"""
         URL = f"https://{ctx.channel.name}.e-sim.org/"
-        bought_amount = 0
-
-        for Index in range(10):  # 10 pages
-            tree = await self.bot.get_content(f"{URL}monetaryMarket.html?buyerCurrencyId={country}", return_tree=True)
-            prices = tree.xpath("//td[3]//b/text()")
-            IDs = [ID.value for ID in tree.xpath("//td[4]//form[1]//input[@value][2]")][:len(prices)]
-            amounts = tree.xpath('//td[2]//b/text()')[:len(prices)]
-            for ID, offer_amount, price in zip(IDs, amounts, prices):
-                if self.bot.should_break(ctx):
-                    return
-                try:
-                    offer_amount, price = float(offer_amount), float(price)
-                    if price > max_price:
-                        await ctx.send(f"**{nick}** The price is too high ({price}).")
-                        break
-                    
-                    payload = {'action': "buy", 'id': ID, 'ammount': round(min(offer_amount, amount - bought_amount), 2),
-                               'stockCompanyId': '', 'submit': 'Buy'}
-                    url = await self.bot.get_content(f"{URL}monetaryMarket.html?buyerCurrencyId={country}", data=payload)
-                    if "MM_POST_OK_BUY" not in str(url):
-                        await ctx.send(f"ERROR: <{url}>")
-                        break
-                    await ctx.send(f"**{nick}** Bought {payload['ammount']} coins at {price} each.")
-                    bought_amount += payload['ammount']
-                    if bought_amount >= amount:
-                        break
-                    await sleep(uniform(0, 2))
-                    # sleeping for a random time between 0 and 2 seconds. feel free to change it
-                    
-                except Exception as error:
-                    await ctx.send(f"**{nick}** ERROR {error}")
-                    await sleep(5)
-            if IDs and ID != IDs[-1]:
-                break
-        await ctx.send(f"**{nick}** bought total {round(bought_amount, 2)} coins.")
+        result = await self.buy_coins(ctx, nick, f"{URL}monetaryMarket.html?buyerCurrencyId={country}", amount, max_price)
+        if result is None:
+            return
+        await ctx.send(f"**{nick}** bought total {result[0]} coins.")
 
     @command()
     async def buy(self, ctx, amount: int, quality: Optional[Quality], product: Product, *, nick: IsMyNick):
@@ -112,6 +135,7 @@ class Eco(Cog):
         my_money = dict(zip([x for x in keys if x], values))
         products_bought = 0
         mm_got = None
+        book = None
         while products_bought < amount and not self.bot.should_break(ctx):
             tree = await self.bot.get_content(f"{URL}productMarket.html?resource={product}&quality={quality}", return_tree=True)
             try:
@@ -126,28 +150,13 @@ class Eco(Cog):
                 mm_type = raw_cost[-1].strip()
                 mm_got = my_money.get(mm_type, 0)
 
-            mm_needed = min(stock, amount - products_bought) * cost - mm_got
-            mm_bought = 0
-            while mm_bought < mm_needed:
-                if self.bot.should_break(ctx):
+            mm_needed = round(min(stock, amount - products_bought) * cost - mm_got, 2)
+            if mm_needed > 0:
+                result = await self.buy_coins(ctx, nick, URL + "monetaryMarket.html", mm_needed, book=book)
+                if result is None:
                     return
-                tree1 = await self.bot.get_content(URL + "monetaryMarket.html", return_tree=True)
-                try:
-                    ID = tree1.xpath("//tr[2]//td[4]//form[1]//input[@value][2]")[0].value
-                    cc_offer = float(tree1.xpath('//tr[2]//td[2]//b')[0].text)
-                    price = float(tree1.xpath('//tr[2]//td[3]//b')[0].text)
-                except:
-                    await ctx.send(f"**{nick}** ERROR: there's no money in the monetary market")
-                    break
-                cc_quantity = round(min(cc_offer, (amount - products_bought) * cost), 2)
-                payload = {'action': "buy", 'id': ID, 'ammount': cc_quantity}
-                url = await self.bot.get_content(URL + "monetaryMarket.html", data=payload)
-                if "MM_POST_OK_BUY" not in url:
-                    await ctx.send(f"ERROR: <{url}>")
-                    break
-                await ctx.send(f"**{nick}** Bought {payload['ammount']} coins at {price} each.")
-                mm_bought += cc_quantity
-            mm_got += mm_bought
+                mm_bought, book = result
+                mm_got += mm_bought
             quantity = min(stock, amount, round(mm_got / cost))
             payload = {'action': "buy", 'id': product_id, 'quantity': quantity, "submit": "Buy"}
             url = await self.bot.get_content(URL + "productMarket.html", data=payload)
@@ -191,7 +200,7 @@ class Eco(Cog):
         """Leaving current job and applying to the given company_id or to the best offer at the local market."""
         URL = f"https://{ctx.channel.name}.e-sim.org/"
         if company_id != 0:
-            api_citizen = await self.bot.get_content(f"{URL}apiCitizenByName.html?name={nick.lower()}")
+            api_citizen = await self.bot.citizens.get(ctx.channel.name, nick)
             tree = await self.bot.get_content(f"{URL}company.html?id={company_id}", return_tree=True)
             job_ids = tree.xpath('//td[4]//input[1]')
             skills = [int(x) for x in tree.xpath('//td[1]/text()') if x.isdigit()]
@@ -242,93 +251,146 @@ class Eco(Cog):
         else:
             await ctx.send(f"**{nick}** On it!")
             max_q_to_merge = int(ids_or_quality.lower().replace("q", ""))  # max_q_to_merge - including
+            storage_link = f'{URL}storage.html?storageType=EQUIPMENT'
+            tree = await self.bot.get_content(storage_link, return_tree=True)
+            fresh = True  # `tree` shows the current storage
+            storage = self.group_equipment(tree, max_q_to_merge)
+            plan = self.plan_merges(storage, max_q_to_merge)
+            if plan:
+                await ctx.send(f"**{nick}** Merges: " + ", ".join(f"{merges}x Q{Q}" for Q, merges in plan.items()))
             results = list()
             error = False
-            for Index in range(5):
-                tree = await self.bot.get_content(f'{URL}storage.html?storageType=EQUIPMENT', return_tree=True)
-                IDs = tree.xpath(f'//*[starts-with(@id, "cell")]/a/text()')
-                items = tree.xpath(f'//*[starts-with(@id, "cell")]/b/text()')
-                DICT = {}
-                for ID, item in zip(IDs, items):
-                    Q = int(item.split()[0].replace("Q", ""))
-                    if Q < max_q_to_merge + 1:
-                        if Q not in DICT:
-                            DICT[Q] = []
-                        DICT[Q].append(int(ID.replace("#", "")))
-                for i in range(1, max_q_to_merge + 1):
-                    for z in range(len(DICT.get(i, [])) // 3):
-                        if self.bot.should_break(ctx):
-                            error = True
-                            break
-                        EQ1, EQ2, EQ3 = DICT[i][z * 3:z * 3 + 3]
-                        payload = {'action': "MERGE", f'itemId[{EQ1}]': EQ1, f'itemId[{EQ2}]': EQ2, f'itemId[{EQ3}]': EQ3}
-                        url = await self.bot.get_content(URL + "equipmentAction.html", data=payload)
-                        results.append(f"<{url}>")
-                        await sleep(uniform(0, 2))
-                        if url == "http://www.google.com/":
-                            # e-sim error
-                            await sleep(5)
-
-                        elif "?actionStatus=CONVERT_ITEM_OK" not in url:
-                            # no money etc
-                            error = True
-                            break
-                    if results:
-                        await ctx.send(f"**{nick}**\n" + "\n".join(results)[:1950])
-                        results.clear()
-                    if error:
+            for Q in range(1, max_q_to_merge + 1):
+                if plan.get(Q, 0) > len(storage.get(Q, [])) // 3:
+                    # the ids of the items that the previous merges made
+                    if not fresh:
+                        tree = await self.bot.get_content(storage_link, return_tree=True)
+                        fresh = True
+                    storage = self.group_equipment(tree, max_q_to_merge)
+                ids = storage.get(Q, [])
+                synced = False
+                while len(ids) >= 3 and not error:
+                    if self.bot.should_break(ctx):
+                        error = True
                         break
+                    EQ1, EQ2, EQ3 = ids[:3]
+                    payload = {'action': "MERGE", f'itemId[{EQ1}]': EQ1, f'itemId[{EQ2}]': EQ2, f'itemId[{EQ3}]': EQ3}
+                    response, url = await self.bot.get_content(URL + "equipmentAction.html", data=payload, return_tree="both")
+                    results.append(f"<{url}>")
+                    await sleep(uniform(0, 2))
+                    if "?actionStatus=CONVERT_ITEM_OK" in url:
+                        del ids[:3]
+                        synced = False
+                        # if the response is the updated storage, there's no need to fetch it later
+                        # (a successful merge leaves at least one item there)
+                        fresh = bool(get_equipment(response))
+                        if fresh:
+                            tree = response
+                    elif synced:
+                        # no money etc
+                        error = True
+                    else:
+                        # maybe one of the items is gone
+                        tree = await self.bot.get_content(storage_link, return_tree=True)
+                        fresh = synced = True
+                        storage = self.group_equipment(tree, max_q_to_merge)
+                        plan = self.plan_merges(storage, max_q_to_merge)
+                        ids = storage.get(Q, [])
+                if results:
+                    await ctx.send(f"**{nick}**\n" + "\n".join(results)[:1950])
+                    results.clear()
                 if error:
                     break
-            await ctx.send(f"**{nick}**\n" + "\n".join(results)[:1950])
+            if not fresh:
+                tree = await self.bot.get_content(storage_link, return_tree=True)
+            return await ctx.send(embed=self.bot.get_cog("Info").eqs_embed(URL, nick, tree))
 
         await ctx.invoke(self.bot.get_command("eqs"), nick=nick)
 
+    @staticmethod
+    def group_equipment(tree, max_q) -> dict:
+        """{quality: [ids]} of the items at the equipment storage, up to `max_q` (included)"""
+        storage = {}
+        for ID, Q in get_equipment(tree):
+            if Q <= max_q:
+                storage.setdefault(Q, []).append(ID)
+        return storage
+
+    @staticmethod
+    def plan_merges(storage, max_q) -> dict:
+        """{quality: number of merges}, including the merges of the items that the lower merges make"""
+        counts = {Q: len(ids) for Q, ids in storage.items()}
+        plan = {}
+        for Q in range(1, max_q + 1):
+            merges = counts.get(Q, 0) // 3
+            if merges:
+                plan[Q] = merges
+                counts[Q + 1] = counts.get(Q + 1, 0) + merges
+        return plan
+
     @command()
     async def mm(self, ctx, *, nick: IsMyNick):
         """Sells all currencies in your account in the appropriate markets & edit current offers if needed."""
         URL = f"https://{ctx.channel.name}.e-sim.org/"
-        api = await self.bot.get_content(URL + "apiCountries.html")
-        storage_tree = await self.bot.get_content(URL + "storage.html?storageType=MONEY", return_tree=True)
+        currency_ids, storage_tree, offers_tree = await gather(
+            self.get_currency_ids(ctx.channel.name),
+            self.bot.get_content(URL + "storage.html?storageType=MONEY", return_tree=True),
+            self.bot.get_content(URL + "monetaryMarket.html", return_tree=True))
+
+        to_post = []  # (currency, amount)
         for i in range(2, 20):
-            if self.bot.should_break(ctx):
-                return
-            try:
-                CC = storage_tree.xpath(f'//*[@id="storageConteiner"]//div//div//div//div[{i}]/text()')[-1].strip()
-                cc = [i["id"] for i in api if i["currencyName"] == CC][0]
-                value = storage_tree.xpath(f'//*[@id="storageConteiner"]//div//div//div//div[{i}]/b/text()')[0]
-                tree = await self.bot.get_content(f'{URL}monetaryMarket.html?buyerCurrencyId={cc}&sellerCurrencyId=0', return_tree=True)
-                try:
-                    MM = str(tree.xpath("//tr[2]//td[3]/b")[0].text).strip()
-                except:
-                    MM = 0.1
-                payload = {"offeredMoneyId": cc, "buyedMoneyId": 0, "value": value,
-                           "exchangeRatio": round(float(MM) - 0.0001, 4), "submit": "Post new offer"}
-                await self.bot.get_content(URL + "monetaryMarket.html?action=post", data=payload)
-                await ctx.send(f"**{nick}** posted {value} {CC} for {payload['exchangeRatio']}")
-            except:
+            CC = storage_tree.xpath(f'//*[@id="storageConteiner"]//div//div//div//div[{i}]/text()')
+            value = storage_tree.xpath(f'//*[@id="storageConteiner"]//div//div//div//div[{i}]/b/text()')
+            if not CC or not value:
+                break
+            if CC[-1].strip() in currency_ids:
+                to_post.append((CC[-1].strip(), value[0]))
+
+        # my current offers (the new offers will be the cheapest anyway, so they don't need an edit)
+        IDs = offers_tree.xpath('//*[@id="command"]//input[1]')
+        to_edit = []  # (currency, offer id)
+        for i in range(2, min(20, len(IDs) + 2)):
+            CC = offers_tree.xpath(f'//*[@id="esim-layout"]//table[2]//tr[{i}]//td[1]/text()')
+            if not CC:
                 break
+            if CC[-1].strip() in currency_ids:
+                to_edit.append((CC[-1].strip(), IDs[i - 2].value))
 
-        tree = await self.bot.get_content(URL + "monetaryMarket.html", return_tree=True)
-        IDs = tree.xpath('//*[@id="command"]//input[1]')
-        for i in range(2, 20):
+        # every market page is fetched once, and shared by the two phases
+        semaphore = Semaphore(5)
+
+        async def get_market(currency):
+            async with semaphore:
+                tree = await self.bot.get_content(
+                    f'{URL}monetaryMarket.html?buyerCurrencyId={currency_ids[currency]}&sellerCurrencyId=0',
+                    return_tree=True)
+            seller = tree.xpath("//tr[2]//td[1]/a/text()")
+            price = tree.xpath("//tr[2]//td[3]/b/text()")
+            return seller[0].strip() if seller else "", float(price[0].strip()) if price else 0.1
+
+        currencies = list(dict.fromkeys([CC for CC, _ in to_post + to_edit]))
+        markets = dict(zip(currencies, await gather(*(get_market(CC) for CC in currencies), return_exceptions=True)))
+
+        for CC, value in to_post:
             if self.bot.should_break(ctx):
                 return
-            try:
-                CC = tree.xpath(f'//*[@id="esim-layout"]//table[2]//tr[{i}]//td[1]/text()')[-1].strip()
-                cc = [i["id"] for i in api if i["currencyName"] == CC][0]
-                tree = await self.bot.get_content(f'{URL}monetaryMarket.html?buyerCurrencyId={cc}&sellerCurrencyId=0', return_tree=True)
-                seller = tree.xpath("//tr[2]//td[1]/a/text()")[0].strip()
-                if seller.lower() != nick.lower():
-                    try:
-                        MM = tree.xpath("//tr[2]//td[3]/b")[0].text
-                    except:
-                        MM = 0.1
-                    payload = {"id": IDs[i - 2].value, "rate": round(float(MM) - 0.0001, 4), "submit": "Edit"}
-                    await self.bot.get_content(URL + "monetaryMarket.html?action=change", data=payload)
-                    await ctx.send(f"**{nick}** edited {CC} for {payload['rate']}")
-            except:
-                break
+            if isinstance(markets[CC], Exception):
+                continue
+            payload = {"offeredMoneyId": currency_ids[CC], "buyedMoneyId": 0, "value": value,
+                       "exchangeRatio": round(markets[CC][1] - 0.0001, 4), "submit": "Post new offer"}
+            await self.bot.get_content(URL + "monetaryMarket.html?action=post", data=payload)
+            await ctx.send(f"**{nick}** posted {value} {CC} for {payload['exchangeRatio']}")
+
+        for CC, ID in to_edit:
+            if self.bot.should_break(ctx):
+                return
+            if isinstance(markets[CC], Exception):
+                continue
+            seller, price = markets[CC]
+            if seller.lower() != nick.lower():
+                payload = {"id": ID, "rate": round(price - 0.0001, 4), "submit": "Edit"}
+                await self.bot.get_content(URL + "monetaryMarket.html?action=change", data=payload)
+                await ctx.send(f"**{nick}** edited {CC} for {payload['rate']}")
 
     @command()
     async def sell(self, ctx, quantity: int, quality: Optional[Quality], product: Product, price: float, country: Country, *, nick: IsMyNick):
@@ -410,38 +472,8 @@ class Eco(Cog):
     @command()
     async def auto_work(self, ctx, work_sessions: Optional[int] = 1, *, nick: IsMyNick):
         """Works at random times throughout every day"""
-        data = await utils.find_one("auto", "work", os.environ['nick'])
-        data_copy = data.copy()
-        data[ctx.channel.name] = {"channel_id": str(ctx.channel.id), "message_id": str(ctx.message.id),
-                                  "work_sessions": work_sessions, "nick": nick}
-        if data != data_copy:
-            await utils.replace_one("auto", "work", os.environ['nick'], data)
-            await ctx.send(f"**{nick}** Alright.")
-
-        sec_between_works = (24 * 60 * 60) // work_sessions
-        while not self.bot.should_break(ctx):  # for every day:
-            tz = timezone('Europe/Berlin')
-            now = datetime.now(tz)
-            midnight = tz.localize(datetime.combine(now + timedelta(days=1), time(0, 0, 0, 0)))
-            sec_til_midnight = (midnight - now).seconds
-            x = uniform(0, min(sec_til_midnight-30, sec_between_works - 2000))
-            await sleep(x)
-            await ctx.invoke(self.bot.get_command("work"), nick=nick)
-            i = work_sessions - 2
-
-            while x + sec_between_works < sec_til_midnight:
-                if self.bot.should_break(ctx):
-                    return
-                x = uniform(x + sec_between_works + 20, sec_til_midnight - i * sec_between_works - i * 60)
-                await sleep(x)
-                await ctx.invoke(self.bot.get_command("work"), nick=nick)
-                i -= 1
-
-            # sleep till midnight
-            tz = timezone('Europe/Berlin')
-            now = datetime.now(tz)
-            midnight = tz.localize(datetime.combine(now + timedelta(days=1), time(0, 0, 0, 0)))
-            await sleep((midnight - now).seconds + 20)
+        await self.bot.scheduler.add(ctx, "work", daily=work_sessions, nick=nick)
+        await ctx.send(f"**{nick}** Alright.")
 
     @command()
     async def send_contracts(self, ctx, contract_id: Id, contract_name, *, nick: IsMyNick):
@@ -484,7 +516,7 @@ async def remove_rejected(bot, URL, blacklist, filter="CONTRACTS", text="has rej
 
 async def _friends_list(bot, nick, server, skip_banned_and_inactive=True):
     URL = f"https://{server}.e-sim.org/"
-    apiCitizen = await bot.get_content(f'{URL}apiCitizenByName.html?name={nick.lower()}')
+    apiCitizen = await bot.citizens.get(server, nick, volatile=False)
 
     for page in range(1, 100):
         tree = await bot.get_content(f'{URL}profileFriendsList.html?id={apiCitizen["id"]}&page={page}', return_tree=True)
@@ -7,6 +7,9 @@ from discord.ext.commands import Cog, check, command
 from lxml.html import fromstring
 from pytz import timezone
 
+import accounts
+from extractors import HomePage, StoragePage, to_int
+from metrics import import_report
 import utils
 from Converters import Country, IsMyNick
 
@@ -22,19 +25,23 @@ class Info(Cog):
         """Shows the code version of the given nick(s).
         Can also use: .ping all"""
         server = ctx.channel.name
-        for nick in [x.strip() for x in nicks.split(",") if x.strip()]:
-            if nick.lower() == "all":
-                nick = utils.my_nick(server)
-                await sleep(randint(1, 10))
-
-            if nick.lower() == utils.my_nick(server).lower():
-                await ctx.send(f'**{utils.my_nick(server)}** Code Version: {self.bot.VERSION}')
+        nicks = [x.strip() for x in nicks.split(",") if x.strip()]
+        if "all" in (nick.lower() for nick in nicks):
+            await sleep(randint(1, 10))  # so the bot processes don't answer at once
+        for nick in nicks:
+            for account in accounts.matching(server, nick):
+                await ctx.send(f'**{account.nick_at(server)}** Code Version: {self.bot.VERSION}')
 
     @command()
     async def eqs(self, ctx, *, nick: IsMyNick):
         """Shows the list of EQs in storage."""
         URL = f"https://{ctx.channel.name}.e-sim.org/"
         tree = await self.bot.get_content(URL + 'storage.html?storageType=EQUIPMENT', return_tree=True)
+        await ctx.send(embed=self.eqs_embed(URL, nick, tree))
+
+    @staticmethod
+    def eqs_embed(URL, nick, tree) -> Embed:
+        """The `.eqs` embed of an equipment storage page"""
         items = tree.xpath(f'//*[starts-with(@id, "cell")]/b/text()')
         original_ids = [ID.replace('#', '') for ID in tree.xpath(f'//*[starts-with(@id, "cell")]/a/text()')]
         parameters = [[utils.get_parameter(p) for p in tree.xpath(f'//*[@id="cell{ID}"]/text()')[3:]] for ID in original_ids]
@@ -49,7 +56,7 @@ class Info(Cog):
         embed.add_field(name="Parameters", value="\n".join(", ".join(par_val[1] for par_val in eq) for eq in parameters[:length]))
         if len(ids) > length:
             embed.set_footer(text=f"({length} out of {len(ids)} items)")
-        await ctx.send(embed=embed)
+        return embed
 
     @command(aliases=["inventory"])
     async def inv(self, ctx, *, nick: IsMyNick):
@@ -58,22 +65,14 @@ class Info(Cog):
         storage_tree = await self.bot.get_content(f"{URL}storage.html?storageType=PRODUCT", return_tree=True)
         special_tree = await self.bot.get_content(f"{URL}storage.html?storageType=SPECIAL_ITEM", return_tree=True)
         special = {}
-        products = {}
         for item in special_tree.xpath('//div[@class="specialItemInventory"]'):
             if item.xpath('span/text()'):
                 special[item.xpath('b/text()')[0]] = item.xpath('span/text()')[0]
 
-        for item in storage_tree.xpath("//div[@class='storage']"):
-            name = item.xpath("div[2]/img/@src")[0].replace("//cdn.e-sim.org//img/productIcons/", "").replace(
-                "Rewards/", "").replace(".png", "")
-            if name.lower() in ["iron", "grain", "diamonds", "oil", "stone", "wood"]:
-                quality = ""
-            else:
-                quality = item.xpath("div[2]/img/@src")[1].replace(
-                    "//cdn.e-sim.org//img/productIcons/", "").replace(".png", "")
-            products[f"{quality.title()} {name}"] = item.xpath("div[1]/text()")[0].strip()
+        storage = StoragePage.from_tree(storage_tree)
+        products = storage.products
 
-        embed = Embed(title=nick, description=storage_tree.xpath('//div[@class="sidebar-money"][1]/b/text()')[0] + " Gold")
+        embed = Embed(title=nick, description=storage.gold + " Gold")
         if products:
             embed.add_field(name="**Storage:**", value="\n".join(f"**{k}**: {v}" for k, v in products.items()))
         if special:
@@ -85,16 +84,7 @@ class Info(Cog):
         """Shows your military unit inventory."""
         URL = f"https://{ctx.channel.name}.e-sim.org/"
         tree = await self.bot.get_content(f"{URL}militaryUnitStorage.html", return_tree=True)
-        products = dict()
-        for item in tree.xpath("//div[@class='storage']"):
-            name = item.xpath("div[2]/img/@src")[0].replace("//cdn.e-sim.org//img/productIcons/", "").replace(
-                "Rewards/", "").replace(".png", "")
-            if name.lower() in ("iron", "grain", "diamonds", "oil", "stone", "wood"):
-                quality = ""
-            else:
-                quality = item.xpath("div[2]/img/@src")[1].replace("//cdn.e-sim.org//img/productIcons/",
-                                                                   "").replace(".png", "")
-            products[f"{quality.title()} {name}"] = int(item.xpath("div[1]/text()")[0].strip())
+        products = StoragePage.from_tree(tree).products
 
         coins_len = max(5, len(products))
         tree = await self.bot.get_content(f"{URL}militaryUnitMoneyAccount.html", return_tree=True)
@@ -104,7 +94,7 @@ class Info(Cog):
         embed = Embed(title=nick)
         if products:
             embed.add_field(name="**Products:**",
-                            value="\n".join(f"**{product}**: {amount:,}" for product, amount in products.items()))
+                            value="\n".join(f"**{product}**: {to_int(amount):,}" for product, amount in products.items()))
         if coins:
             embed.add_field(name=f"**Coins (first {coins_len}):**",
                             value="\n".join(f"**{coin.strip()}**: {round(float(amount), 2):,}" for coin, amount in zip(coins, amounts)))
@@ -114,14 +104,24 @@ class Info(Cog):
     @command()
     async def limits(self, ctx, *, nick: IsMyNick):
         URL = f"https://{ctx.channel.name}.e-sim.org/"
-        tree = await self.bot.get_content(URL + "home.html", return_tree=True)
-        gold = tree.xpath('//*[@id="userMenu"]//div//div[4]//div[1]/b/text()')[0]
-        food_storage = tree.xpath('//*[@id="foodQ5"]/text()')[0]
-        gift_storage = tree.xpath('//*[@id="giftQ5"]/text()')[0]
-        food_limit = tree.xpath('//*[@id="foodLimit2"]')[0].text
-        gift_limit = tree.xpath('//*[@id="giftLimit2"]')[0].text
-        await ctx.send(
-            f"**{nick}** Limits: {food_limit}/{gift_limit}, storage: {food_storage}/{gift_storage}, {gold} Gold.")
+        home = HomePage.from_tree(await self.bot.get_content(URL + "home.html", return_tree=True))
+        await ctx.send(f"**{nick}** Limits: {home.food_limit}/{home.gift_limit}, "
+                       f"storage: {home.food_storage}/{home.gift_storage}, {home.gold} Gold.")
+
+    @command(hidden=True)
+    async def stats(self, ctx, *, nick: IsMyNick):
+        """Request counts, latency and parse time of this server (since the bot started)"""
+        summary = self.bot.metrics.summary(ctx.channel.name)
+        key = (ctx.channel.name, accounts.current().nick)
+        if key in self.bot.pacers:
+            summary += f"\nhits: {self.bot.pacers[key]}"
+        await ctx.send(f"**{nick}**\n```{summary}```"[:1990])
+
+    @command(hidden=True)
+    async def imports(self, ctx, nick: IsMyNick, top: int = 15):
+        """Import time of the cogs and everything they import (`python -X importtime`), the slowest first"""
+        report = await import_report(list(self.bot.extensions) + ["utils"], top)
+        await ctx.send(f"**{nick}**\n```{report}```"[:1990])
 
     @command()
     @check(utils.is_helper)
@@ -162,6 +162,11 @@ class Info(Cog):
         """Lists some details about the first upcoming 10 auctions"""
         URL = f"https://{ctx.channel.name}.e-sim.org/"
         tree = await self.bot.get_content(URL + "auctions.html", return_tree=True)
+        await ctx.send(embed=self.auctions_embed(URL, tree))
+
+    @staticmethod
+    def auctions_embed(URL, tree) -> Embed:
+        """The `.auctions` embed of an auctions page"""
         col1 = list()
         col2 = list()
         col3 = list()
@@ -189,21 +194,30 @@ class Info(Cog):
         embed.add_field(name="Seller : Buyer", value="\n".join(col1))
         embed.add_field(name="Item", value="\n".join(col2))
         embed.add_field(name="Gold : Time Reminding", value="\n".join(col3))
-        await ctx.send(embed=embed)
+        return embed
 
     @command(name="info-", hidden=True)
     @check(utils.is_helper)
     async def info_(self, ctx):
-        values = await utils.find(ctx.channel.name, "info")
-        if values:
-            values.sort(key=lambda x: x.get('Buffed at', "-"))
+        async def send(rows):
             embed = Embed()
-            embed.add_field(name="Nick", value="\n".join([row["_id"] for row in values]))
-            embed.add_field(name="Worked At", value="\n".join([row.get("Worked at", "-") for row in values]))
-            embed.add_field(name="Buffed At", value="\n".join([row.get("Buffed at", "-") for row in values]))
+            embed.add_field(name="Nick", value="\n".join([row["_id"] for row in rows]))
+            embed.add_field(name="Worked At", value="\n".join([row.get("Worked at", "-") for row in rows]))
+            embed.add_field(name="Buffed At", value="\n".join([row.get("Buffed at", "-") for row in rows]))
             embed.set_footer(text="Type .info <nick> for more info on a nick")
             await ctx.send(embed=embed)
-        else:
+
+        rows = []
+        sent = False
+        async for row in utils.find(ctx.channel.name, "info", projection=["Worked at", "Buffed at"], sort="Buffed at"):
+            rows.append(row)
+            if len(rows) == 25:  # embed fields are limited to 1024 chars
+                await send(rows)
+                rows.clear()
+                sent = True
+        if rows:
+            await send(rows)
+        elif not sent:
             await ctx.send("No data available")
 
     @command()
@@ -242,7 +256,7 @@ class Info(Cog):
             except:
                 break
 
-        api = await self.bot.get_content(URL + 'apiCitizenByName.html?name=' + nick.lower())
+        api = await self.bot.citizens.get(server, nick)
         data = await utils.find_one(server, "info", nick)
         date_format = "%Y-%m-%d %H:%M:%S"
 
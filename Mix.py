@@ -1,7 +1,7 @@
 import json
 from asyncio import sleep
 from base64 import b64encode
-from datetime import datetime
+from datetime import datetime, timedelta
 from io import BytesIO, StringIO
 from os import environ
 from random import choice, randint, uniform
@@ -15,6 +15,7 @@ from discord import File
 from discord.ext.commands import Cog, command, is_owner
 from pytz import timezone
 
+import accounts
 import utils
 from Converters import Country, Id, IsMyNick, Quality
 
@@ -102,8 +103,7 @@ class Mix(Cog):
             if self.bot.should_break(ctx):
                 break
             try:
-                tree = await self.bot.get_content(URL + "home.html", return_tree=True)
-                my_id = str(tree.xpath('//*[@id="userName"]/@href')[0]).split("=")[1]
+                tree = await self.bot.get_content(URL + "home.html", return_tree=True)  # for the mission number
                 try:
                     num = int(str(tree.xpath('//*[@id="inProgressPanel"]/div[1]/div/strong')[0].text).split("#")[1])
                 except:
@@ -160,14 +160,15 @@ class Mix(Cog):
                         payload = {'action': "buy", 'id': productId, 'quantity': 1, "submit": "Buy"}
                         await self.bot.get_content(URL + "productMarket.html", data=payload)
                     elif num in (12, 54):
-                        Citizen = await self.bot.get_content(f'{URL}apiCitizenById.html?id={my_id}')
+                        Citizen = await self.bot.citizens.get(server, utils.my_nick(server), volatile=False)
                         capital = [row['id'] for row in await self.bot.get_content(URL + "apiRegions.html") if row[
                             'homeCountry'] == Citizen['citizenshipId'] and row['capital']][0]
                         await ctx.invoke(self.bot.get_command("fly"), capital, 5, nick=nick)
                     elif num in (13, 66):
                         await self.bot.get_content(URL + 'friends.html?action=PROPOSE&id=8')
                         await self.bot.get_content(URL + "citizenAchievements.html",
-                                                   data={"id": my_id, "submit": "Recalculate achievements"})
+                                                   data={"id": await self.bot.citizens.my_id(server),
+                                                         "submit": "Recalculate achievements"})
                     elif num == 14:
                         tree = await self.bot.get_content(URL + 'storage.html?storageType=EQUIPMENT', return_tree=True)
                         ID = tree.xpath(f'//*[starts-with(@id, "cell")]/a/text()')[0].replace("#", "")
@@ -182,7 +183,7 @@ class Mix(Cog):
                                    "sendToMilitaryUnit": "on", "sendToParty": "on", "sendToFriends": "on"}
                         await self.bot.get_content(f"{URL}shoutActions.html", data=payload)
                     elif num == 19:
-                        Citizen = await self.bot.get_content(f'{URL}apiCitizenById.html?id={my_id}')
+                        Citizen = await self.bot.citizens.get(server, utils.my_nick(server), volatile=False)
                         tree = await self.bot.get_content(f"{URL}monetaryMarket.html?buyerCurrencyId=0&sellerCurrencyId=" +
                                                           str(Citizen['citizenshipId']), return_tree=True)
                         try:
@@ -199,7 +200,7 @@ class Mix(Cog):
                         except IndexError:
                             await ctx.send(f"**{nick}** ERROR: no equipment in storage")
                     elif num == 22:
-                        Citizen = await self.bot.get_content(f'{URL}apiCitizenById.html?id={my_id}')
+                        Citizen = await self.bot.citizens.get(server, utils.my_nick(server), volatile=False)
                         payload = {'product': "GRAIN", 'countryId': Citizen['citizenshipId'], 'storageType': "PRODUCT",
                                    "action": "POST_OFFER", "price": 0.1, "quantity": 100}
                         sell_grain = await self.bot.get_content(URL + "storage.html", data=payload)
@@ -262,7 +263,7 @@ class Mix(Cog):
                     elif num in (61, 55):
                         await ctx.invoke(self.bot.get_command("motivate"), nick=nick)
                     elif num == 57:
-                        Citizen = await self.bot.get_content(f'{URL}apiCitizenById.html?id={my_id}')
+                        Citizen = await self.bot.citizens.get(server, utils.my_nick(server), volatile=False)
                         payload = {'receiverName': f"{Citizen['citizenship']} Org", "title": "Hi",
                                    "body": choice(["Hi", "Can you send me some gold?", "Hello there!", "Discord?"]),
                                    "action": "REPLY", "submit": "Send"}
@@ -361,7 +362,7 @@ class Mix(Cog):
         async with ClientSession(headers=headers) as session:
             async with session.get(URL, ssl=True) as _:
                 async with session.get(URL + "index.html?advancedRegistration=true&lan=" + lan.replace(f"{URL}lan.", ""), ssl=True) as _:
-                    payload = {"login": nick, "password": environ.get(server+"_pw", environ['pw']), "mail": "",
+                    payload = {"login": nick, "password": accounts.current().password_at(server), "mail": "",
                                "countryId": country, "checkHuman": "Human"}
                     async with session.post(URL + "registration.html", data=payload, ssl=True) as registration:
                         if "profile" not in str(registration.url) and URL + "index.html" not in str(registration.url):
@@ -460,7 +461,7 @@ class Mix(Cog):
         if ctx.invoked_with.lower() == "revoke":
             payload = {"revokeLogin": citizen, "action": "REVOKE_CITIZENSHIP", "submit": "Revoke citizenship"}
         else:
-            api_citizen = await self.bot.get_content(f"{URL}apiCitizenByName.html?name={citizen.lower()}")
+            api_citizen = await self.bot.citizens.get(ctx.channel.name, citizen, volatile=False)
             payload = {"candidate": api_citizen["id"], "action": "ELECT_PRESIDENT", "submit": "Propose president"}
         await self.bot.get_content(URL + "countryLaws.html")
         url = await self.bot.get_content(URL + "countryLaws.html", data=payload)
@@ -475,6 +476,24 @@ class Mix(Cog):
         url = await self.bot.get_content(URL + "countryLaws.html", data=payload)
         await ctx.send(f"**{nick}** <{url}>")
 
+    @command()
+    async def jobs(self, ctx, *, nick: IsMyNick):
+        """Lists the scheduled commands (auto_work, auto_motivate, attack / bid with a delay) at this server"""
+        jobs = self.bot.scheduler.find(ctx.channel.name, accounts.current().nick)
+        now = datetime.now().timestamp()
+        lines = [f"`{job_id}` {job['name']} in {timedelta(seconds=round(job['when'] - now))}" +
+                 (f" ({job['daily']} a day)" if job['daily'] else "") for job_id, job in jobs]
+        await ctx.send(f"**{nick}**\n" + ("\n".join(lines) or "Nothing is scheduled."))
+
+    @command()
+    async def cancel(self, ctx, job_id, *, nick: IsMyNick):
+        """Cancels a scheduled command (the ids are at `.jobs`)"""
+        if job_id in dict(self.bot.scheduler.find(ctx.channel.name, accounts.current().nick)):
+            await self.bot.scheduler.cancel(job_id)
+            await ctx.send(f"**{nick}** done.")
+        else:
+            await ctx.send(f"**{nick}** ERROR: There is no job `{job_id}` (see `.jobs`)")
+
     @command(hidden=True)
     async def click(self, ctx, nick: IsMyNick, link, *, data="{}"):
         """Clicks on a given link.
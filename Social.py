@@ -16,6 +16,18 @@ class Social(Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    @staticmethod
+    def notifications(tree, count) -> list:
+        """[(alert, date, links)] of the first `count` rows of a notifications page"""
+        alerts = []
+        for tr in range(2, count + 2):
+            alert = tree.xpath(f'//tr[{tr}]//td[2]')
+            if not alert:
+                break
+            alerts.append((alert[0].text_content().strip(), tree.xpath(f'//tr[{tr}]//td[3]')[0].text_content().strip(),
+                           [x for x in tree.xpath(f"//tr[{tr}]//td[2]/a[2]/@href")]))
+        return alerts
+
     @command()
     async def comment(self, ctx, action, shout_or_article_link, body, *, nick: IsMyNick):
         """Commenting an article or a shout.
@@ -67,11 +79,8 @@ class Social(Cog):
             for page in range(1, reminding_alerts // 20 + 2):
                 tree = await self.bot.get_content(f"{URL}notifications.html?page={page}", return_tree=True)
                 embed = Embed(title=f"**{nick}** {URL}notifications.html?page={page}\n")
-                for tr in range(2, min(20, reminding_alerts) + 2):
+                for alert, alert_date, links in self.notifications(tree, min(20, reminding_alerts)):
                     try:
-                        alert = tree.xpath(f'//tr[{tr}]//td[2]')[0].text_content().strip()
-                        alert_date = tree.xpath(f'//tr[{tr}]//td[3]')[0].text_content().strip()
-                        links = [x for x in tree.xpath(f"//tr[{tr}]//td[2]/a[2]/@href")]
                         if "has requested to add you as a friend" in alert:
                             await self.bot.get_content(URL + str(links[0]))
                         elif "has offered you to sign" in alert:
@@ -1,14 +1,15 @@
 import re
-from asyncio import sleep
-from datetime import datetime, time as dt_time, timedelta
+from asyncio import Semaphore, gather, sleep
+from datetime import datetime, timedelta
 from random import randint, uniform
 import time
 from typing import Optional
-import os
 
 from discord.ext.commands import Cog, command
 from pytz import timezone
 
+import accounts
+from extractors import BattlePage, get_food_limit, get_health, get_round_id, get_side_score
 import utils
 from Converters import Dmg, Id, IsMyNick, Product, Quality, Side
 
@@ -19,23 +20,42 @@ class War(Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    @staticmethod
+    def new_citizen(tree) -> tuple:
+        """(age in days, whether it can be motivated) of a profile page"""
+        today = int(tree.xpath('//*[@class="sidebar-clock"]/b/text()')[-1].split()[-1])
+        birthday = int(tree.xpath('//*[@class="profile-row" and span = "Birthday"]/span/text()')[0].split()[-1])
+        return today - birthday, bool(tree.xpath('//*[@id="motivateCitizenButton"]'))
+
+    async def hit(self, server, fight_url, data):
+        """One hit, paced by the Pacer of the current account at the server (see pacing.py).
+        Slow downs are retried (up to 5 times)"""
+        pacer = self.bot.pacers[(server, accounts.current().nick)]
+        for _ in range(5):
+            sent_at = await pacer.wait()
+            start = time.monotonic()
+            result = await self.bot.get_content(fight_url, data=data, return_type="fight")
+            if result.health is None and "Slow down a bit!" in result.text:
+                pacer.on_slow_down(sent_at)
+                continue
+            pacer.on_accepted(time.monotonic() - start)
+            return result
+        return result
+
     async def dump_health(self, server, battle_id, side, wep):
         URL = f"https://{server}.e-sim.org/"
         tree = await self.bot.get_content(f'{URL}battle.html?id={battle_id}', return_tree=True)
         fight_url, data = await self.get_fight_data(URL, tree, wep, side)
+        Health = get_health(tree)
         for _ in range(1, 20):
-            Health = tree.xpath("//*[@id='healthUpdate']/text()") or tree.xpath('//*[@id="actualHealth"]/text()')
-            if Health:
-                Health = float(Health[0].split()[0])
-            else:
+            if Health is None:
                 tree = await self.bot.get_content(f'{URL}battle.html?id={battle_id}', return_tree=True)
-                Health = float(tree.xpath('//*[@id="actualHealth"]')[0].text)
+                Health = BattlePage.from_tree(tree).health
 
             if Health == 0:
                 break
             data["value"] = "Berserk" if Health >= 50 else ""
-            tree = await self.bot.get_content(fight_url, data=data, return_tree=True)
-            await sleep(uniform(0, 2))
+            Health = (await self.hit(server, fight_url, data)).health
 
     @command()
     async def auto_fight(self, ctx, nick: IsMyNick, restores: int = 100, battle_id: Id = 0,
@@ -179,7 +199,7 @@ class War(Cog):
     @classmethod
     async def get_fight_data(cls, URL, tree, wep, side, value="Berserk"):
         fight_page_id = re.sub("[\"\']*", "", re.findall('url: (\".*fight.*.html\")', tree.text_content())[0])
-        hidden_id = tree.xpath("//*[@id='battleRoundId']")[0].value
+        hidden_id = get_round_id(tree)
         data = {"weaponQuality": wep, "battleRoundId": hidden_id, "side": side, "value": value}
         data.update(cls.convert_to_dict("".join(tree.xpath("//script[3]/text()")).split("&ip=")[1].split("'")[0]))
         return f"{URL}{fight_page_id}", data
@@ -204,15 +224,13 @@ class War(Cog):
         dmg = dmg_or_hits
         api = await self.bot.get_content(link.replace("battle", "apiBattles").replace("id", "battleId"))
         tree = await self.bot.get_content(link, return_tree=True)
-        Health = float(tree.xpath('//*[@id="actualHealth"]')[0].text)
-        food_storage = int((tree.xpath('//*[@id="sfoodQ5"]/text()') or [0])[0])
-        gift_storage = int((tree.xpath('//*[@id="sgiftQ5"]/text()') or [0])[0])
-        food_limit = int(float(tree.xpath('//*[@id="foodLimit2"]')[0].text))
-        gift_limit = int(float(tree.xpath('//*[@id="giftLimit2"]')[0].text))
+        page = BattlePage.from_tree(tree)
+        Health = page.health
+        food_storage, gift_storage = page.food_storage, page.gift_storage
+        food_limit, gift_limit = page.food_limit, page.gift_limit
         try:
-            wep = weapon_quality if not weapon_quality else int(
-                tree.xpath(f'//*[@id="Q{weapon_quality}WeaponStock"]/text()')[0])
-        except:
+            wep = weapon_quality if not weapon_quality else page.weapons[weapon_quality]
+        except KeyError:
             return await ctx.send(f"ERROR: There are 0 Q{weapon_quality} in storage")
 
         if 1 <= ticket_quality <= 5:
@@ -265,33 +283,31 @@ class War(Cog):
                     await self.bot.get_content(f"{URL}{use}.html", data={'quality': 5})
                     Health += 50
 
-            tree = await self.bot.get_content(fight_url, data=data, return_tree=True)
-            if not tree.xpath("//*[@id='healthUpdate']/text()"):
-                if "Slow down a bit!" in tree.text_content():
-                    await sleep(1)
+            result = await self.hit(server, fight_url, data)
+            if result.health is None:
+                if "Slow down a bit!" in result.text:
                     continue
-                elif "No health left" in tree.text_content():
+                elif "No health left" in result.text:
                     Health = 0
                     continue
-                elif "Round is closed" in tree.text_content():
+                elif "Round is closed" in result.text:
                     output += f"\nRound is over."
                     break
                 else:
                     error = True
-                    res = tree.xpath('//div//div/text()')
+                    res = result.tree.xpath('//div//div/text()')
                     await ctx.send(f"**{nick}** ERROR: {' '.join(res).strip()}")
                     break
             if weapon_quality:
                 wep -= 5 if dmg >= 5 else 1
-            Health = float(tree.xpath("//*[@id='healthUpdate']")[0].text.split()[0])
+            Health = result.health
             if dmg < 5:
                 damage_done += 1
             elif dmg < 1000:
                 damage_done += 5
             else:
-                damage_done += int(str(tree.xpath('//*[@id="DamageDone"]')[0].text).replace(",", ""))
+                damage_done += result.damage
             update += 1
-            await sleep(uniform(0.3, 0.55))
 
             if update % 4 == 0:
                 # dmg update every 4 berserks.
@@ -306,20 +322,14 @@ class War(Cog):
         server = ctx.channel.name
         Command = Command.lower()
         for nick in [x.strip() for x in nicks.split(",") if x.strip()]:
-            if nick.lower() == "all":
-                nick = utils.my_nick(server)
-                await sleep(uniform(1, 10))
-            if nick.lower() == utils.my_nick(server).lower():
-                if server not in self.bot.should_break_dict:
-                    self.bot.should_break_dict[server] = {}
-                self.bot.should_break_dict[server][Command] = True
-                if "auto_" in Command and "fight" not in Command:  # auto_motivate and auto_work
-                    data = await utils.find_one("auto", Command.split("_")[1], os.environ['nick'])
-                    if server in data:
-                        del data[server]
-                        await utils.replace_one("auto", Command.split("_")[1], os.environ['nick'], data)
-
-                await ctx.send(f"**{nick}** done.")
+            for account in accounts.matching(server, nick):
+                if not await self.bot.scheduler.cancel(server=server, account=account.nick, name=Command):
+                    key = (server, account.nick)
+                    if key not in self.bot.should_break_dict:
+                        self.bot.should_break_dict[key] = {}
+                    self.bot.should_break_dict[key][Command] = True
+
+                await ctx.send(f"**{account.nick_at(server)}** done.")
 
     @command()
     async def hunt(self, ctx, nick: IsMyNick, max_dmg_for_bh: Dmg = 1, weapon_quality: Quality = 5, start_time: int = 30,
@@ -330,27 +340,41 @@ class War(Cog):
         server = ctx.channel.name
         URL = f"https://{server}.e-sim.org/"
         await ctx.send(f"**{nick}** Starting to hunt at {server}.")
-        apiCitizen = await self.bot.get_content(f"{URL}apiCitizenByName.html?name={str(nick).lower()}")
-        apiRegions = await self.bot.get_content(URL + "apiRegions.html")
+        apiCitizen = await self.bot.citizens.get(server, str(nick), volatile=False)
+        semaphore = Semaphore(10)
+
+        async def get_battle(battle_id):
+            async with semaphore:
+                return await self.bot.get_content(f'{URL}apiBattles.html?battleId={battle_id}')
+
         for _ in range(100):
-            battles_time = {}
             apiMap = await self.bot.get_content(f'{URL}apiMap.html')
-            for row in apiMap:
-                if "battleId" in row:
-                    apiBattles = await self.bot.get_content(f'{URL}apiBattles.html?battleId={row["battleId"]}')
-                    round_ends = apiBattles["hoursRemaining"] * 3600 + apiBattles["minutesRemaining"] * 60 + apiBattles[
-                        "secondsRemaining"]
-                    battles_time[row["battleId"]] = round_ends
+            battle_ids = [row["battleId"] for row in apiMap if "battleId" in row]
+            scan_time = time.time()
+            battles = {}
+            battles_time = {}
+            for battle_id, apiBattles in zip(battle_ids, await gather(
+                    *(get_battle(battle_id) for battle_id in battle_ids), return_exceptions=True)):
+                if isinstance(apiBattles, Exception):
+                    continue
+                round_ends = apiBattles["hoursRemaining"] * 3600 + apiBattles["minutesRemaining"] * 60 + apiBattles[
+                    "secondsRemaining"]
+                battles[battle_id] = apiBattles
+                battles_time[battle_id] = round_ends
 
             for battle_id, round_ends in sorted(battles_time.items(), key=lambda x: x[1]):
-                apiBattles = await self.bot.get_content(f'{URL}apiBattles.html?battleId={battle_id}')
+                apiBattles = battles[battle_id]
                 if apiBattles['frozen']:
                     continue
-                t = apiBattles["hoursRemaining"] * 3600 + apiBattles["minutesRemaining"] * 60 + apiBattles[
-                    "secondsRemaining"]
+                t = round(round_ends - (time.time() - scan_time))
+                if t <= 0:  # the scanned round is over, get the new one
+                    apiBattles = await self.bot.get_content(f'{URL}apiBattles.html?battleId={battle_id}')
+                    t = apiBattles["hoursRemaining"] * 3600 + apiBattles["minutesRemaining"] * 60 + apiBattles[
+                        "secondsRemaining"]
                 await ctx.send(f"**{nick}** Seconds till next battle: {t}")
+                battle_state = self.bot.battles.get(server, battle_id, start_time)
                 if t > start_time:
-                    await sleep(t - start_time)
+                    apiBattles = await battle_state.round_end(start_time)
                 api_fights = await self.bot.get_content(
                     f'{URL}apiFights.html?battleId={battle_id}&roundId={apiBattles["currentRound"]}')
                 defender, attacker = {}, {}
@@ -361,25 +385,23 @@ class War(Cog):
                     else:
                         side[hit['citizenId']] = hit['damage']
 
-                neighbours_id = [region['neighbours'] for region in apiRegions if region["id"] == apiBattles['regionId']]
-                if not neighbours_id:
+                world = await utils.world_map(self.bot, URL)
+                if apiBattles['regionId'] not in world.neighbours:
                     continue  # Not an attack / RW.
-                aBonus = [neighbour for region in apiMap for neighbour in neighbours_id[0] if
-                          neighbour == region['regionId'] and region['occupantId'] == apiBattles['attackerId']]
+                aBonus = world.adjacent(apiBattles['regionId'], apiBattles['attackerId'])
 
                 async def fight(side, damage_done):
                     tree = await self.bot.get_content(f'{URL}battle.html?id={battle_id}', return_tree=True)
-                    Health = float(str(tree.xpath("//*[@id='actualHealth']")[0].text))
-                    hidden_id = tree.xpath("//*[@id='battleRoundId']")[0].value
-                    food = int(tree.xpath('//*[@id="foodLimit2"]')[0].text)
-                    gift = int(tree.xpath('//*[@id="giftLimit2"]')[0].text)
+                    page = BattlePage.from_tree(tree)
+                    Health = page.health
+                    hidden_id = page.round_id
+                    food = page.food_limit
+                    gift = page.gift_limit
                     if Health < 50:
                         use = "eat" if food else "gift"
                         await self.bot.get_content(f"{URL}{use}.html", data={'quality': 5})
                         Health += 50
-                    battleScore = await self.bot.get_content(
-                        f'{URL}battleScore.html?id={hidden_id}&at={apiCitizen["id"]}&ci={apiCitizen["citizenshipId"]}&premium=1',
-                        return_type="json")
+                    battleScore = await battle_state.get_score(hidden_id, apiCitizen)
                     Damage = 0
                     if server in dead_servers:
                         value = "Berserk" if battleScore["spectatorsOnline"] != 1 and Health >= 50 else ""
@@ -388,15 +410,12 @@ class War(Cog):
                     fight_url, data = await self.get_fight_data(URL, tree, weapon_quality, side, value)
                     for _ in range(5):
                         try:
-                            tree = await self.bot.get_content(fight_url, data=data, return_tree=True)
-                            Damage = int(str(tree.xpath('//*[@id="DamageDone"]')[0].text).replace(",", ""))
-                            Health = tree.xpath("//*[@id='healthUpdate']/text()") or tree.xpath(
-                                '//*[@id="actualHealth"]/text()')
-                            if Health:
-                                Health = float(Health[0].split()[0])
-                            else:
-                                Health = 0
-                            await sleep(0.3)
+                            result = await self.hit(server, fight_url, data)
+                            if result.damage is None:
+                                await sleep(2)
+                                continue
+                            Damage = result.damage
+                            Health = result.health or 0
                             break
                         except:
                             await sleep(2)
@@ -411,16 +430,9 @@ class War(Cog):
 
                 async def check(side, damage_done, should_continue):
                     tree = await self.bot.get_content(f'{URL}battle.html?id={battle_id}', return_tree=True)
-                    hidden_id = tree.xpath("//*[@id='battleRoundId']")[0].value
-
-                    try:
-                        top1Name = tree.xpath(f"//*[@id='top{side}1']//div//a[1]/text()")[0].strip()
-                        top1dmg = int(str(tree.xpath(f'//*[@id="top{side}1"]/div/div[2]')[0].text).replace(",", ""))
-                    except:
-                        top1Name, top1dmg = "None", 0
-                    battleScore = await self.bot.get_content(
-                        f'{URL}battleScore.html?id={hidden_id}&at={apiCitizen["id"]}&ci={apiCitizen["citizenshipId"]}&premium=1',
-                        return_type="json")
+                    hidden_id = get_round_id(tree)
+                    top1Name, top1dmg = BattlePage.top_hitter(tree, side)
+                    battleScore = await battle_state.get_score(hidden_id, apiCitizen)
                     # condition - You are top 1 / did more dmg than your limit / refresh problem
                     condition = (top1Name == nick or
                                  damage_done > max_dmg_for_bh or
@@ -432,16 +444,13 @@ class War(Cog):
                     else:
                         if top1dmg < max_dmg_for_bh and condition:
                             if not should_continue:
-                                food = int(tree.xpath('//*[@id="foodLimit2"]')[0].text)
-                                use = "eat" if food else "gift"
+                                use = "eat" if get_food_limit(tree) else "gift"
                                 await self.bot.get_content(f"{URL}{use}.html", data={'quality': 5})
                                 try:
                                     await sleep(battleScore["remainingTimeInSeconds"] - 13)
                                 except:
                                     pass
-                                battleScore = await self.bot.get_content(
-                                    f'{URL}battleScore.html?id={hidden_id}&at={apiCitizen["id"]}&ci={apiCitizen["citizenshipId"]}&premium=1',
-                                    return_type="json")
+                                battleScore = await battle_state.get_score(hidden_id, apiCitizen)
                                 if battleScore[f"{side.lower()}sOnline"]:
                                     await fight(side, damage_done)
                             return False
@@ -501,12 +510,13 @@ class War(Cog):
         URL = f"https://{server}.e-sim.org/"
         dmg = dmg_or_hits_per_bh
         hits_or_dmg = "hits" if dmg < 1000 else "dmg"
+        battle_state = self.bot.battles.get(server, link.split("id=")[-1].split("&")[0], start_time)
         while not self.bot.should_break(ctx):  # For each round
-            api = await self.bot.get_content(link.replace("battle", "apiBattles").replace("id", "battleId"))
-            if 8 in (api['defenderScore'], api['attackerScore']):
+            await battle_state.current()
+            if battle_state.is_over:
                 await ctx.send(f"**{nick}** <{link}> is over")
                 break
-            seconds_till_round_end = api["hoursRemaining"] * 3600 + api["minutesRemaining"] * 60 + api["secondsRemaining"]
+            seconds_till_round_end = round(battle_state.seconds_left)
             if seconds_till_round_end < 20:
                 await sleep(30)
                 continue
@@ -516,24 +526,21 @@ class War(Cog):
                            f"If you want to cancel it, type `.hold hunt_battle {nick}`")
             await sleep(seconds_till_hit)
             tree = await self.bot.get_content(link, return_tree=True)
-            if int(str(tree.xpath(f'//*[@id="{side}Score"]/text()')[0]).replace(",", "").strip()) != 0 and dmg_or_hits_per_bh == 1:
+            if get_side_score(tree, side) != 0 and dmg_or_hits_per_bh == 1:
                 await ctx.send(f"**{nick}** someone else already fought in this round <{link}>")
                 await sleep(seconds_till_round_end - seconds_till_hit + 15)
                 continue
-            food_limit = int(tree.xpath('//*[@id="foodLimit2"]')[0].text)
-            food_storage = int((tree.xpath('//*[@id="sfoodQ5"]/text()') or [0])[0])
-            gift_limit = int(tree.xpath('//*[@id="giftLimit2"]')[0].text)
-            gift_storage = int((tree.xpath('//*[@id="sgiftQ5"]/text()') or [0])[0])
+            page = BattlePage.from_tree(tree)
+            food_limit, food_storage = page.food_limit, page.food_storage
+            gift_limit, gift_storage = page.gift_limit, page.gift_storage
             damage_done = 0
             fight_url, data = await self.get_fight_data(URL, tree, weapon_quality, side, value=("Berserk" if dmg >= 5 else ""))
+            Health = page.health
 
             while damage_done < dmg and not self.bot.should_break(ctx, False):
-                Health = tree.xpath('//*[@id="actualHealth"]/text()') or tree.xpath("//*[@id='healthUpdate']/text()")
-                if Health:
-                    Health = float(Health[0].split()[0])
-                else:
+                if Health is None:
                     tree = await self.bot.get_content(link, return_tree=True)
-                    Health = float(tree.xpath('//*[@id="actualHealth"]')[0].text)
+                    Health = BattlePage.from_tree(tree).health
                 if (dmg < 5 and Health < 10) or (dmg >= 5 and Health < 50):
                     if (not food or food_storage == 0) and (not gift or gift_storage == 0):
                         return await ctx.send(f"**{nick}** ERROR: food/gift storage error")
@@ -551,17 +558,17 @@ class War(Cog):
                         return await ctx.send(f"**{nick}** ERROR: I couldn't restore health.")
                     Health += 50
 
-                tree = await self.bot.get_content(fight_url, data=data, return_tree=True)
-                if not tree.xpath('//*[@id="DamageDone"]'):
-                    if "Slow down a bit!" in tree.text_content():
-                        await sleep(1)
+                result = await self.hit(server, fight_url, data)
+                Health = result.health
+                if result.damage is None:
+                    if "Slow down a bit!" in result.text:
                         continue
-                    elif "No health left" in tree.text_content():
+                    elif "No health left" in result.text:
                         continue
-                    elif "Round is closed" in tree.text_content():
+                    elif "Round is closed" in result.text:
                         break
                     else:
-                        res = tree.xpath('//div//div/text()')
+                        res = result.tree.xpath('//div//div/text()')
                         await ctx.send(f"**{nick}** ERROR: {' '.join(res).strip()}")
                         break
                 if dmg < 5:
@@ -569,8 +576,7 @@ class War(Cog):
                 elif dmg < 1000:
                     damage_done += 5
                 else:
-                    damage_done += int(str(tree.xpath('//*[@id="DamageDone"]')[0].text).replace(",", ""))
-                await sleep(uniform(0, 2))
+                    damage_done += result.damage
 
             await ctx.send(f"**{nick}** done {damage_done:,} {hits_or_dmg} at <{link}>")
             if not self.bot.should_break(ctx, False):
@@ -579,26 +585,8 @@ class War(Cog):
     @command()
     async def auto_motivate(self, ctx, *, nick: IsMyNick):
         """Motivates at random times throughout every day"""
-        data = await utils.find_one("auto", "motivate", os.environ['nick'])
-        data_copy = data.copy()
-        data[ctx.channel.name] = {"channel_id": str(ctx.channel.id), "message_id": str(ctx.message.id), "nick": nick}
-        if data != data_copy:
-            await utils.replace_one("auto", "motivate", os.environ['nick'], data)
-            await ctx.send(f"**{nick}** Alright.")
-
-        while not self.bot.should_break(ctx):  # for every day:
-            tz = timezone('Europe/Berlin')
-            now = datetime.now(tz)
-            midnight = tz.localize(datetime.combine(now + timedelta(days=1), dt_time(0, 0, 0, 0)))
-            sec_til_midnight = (midnight - now).seconds
-            await sleep(uniform(0, sec_til_midnight - 600))
-            await ctx.invoke(self.bot.get_command("motivate"), nick=nick)
-
-            # sleep till midnight
-            tz = timezone('Europe/Berlin')
-            now = datetime.now(tz)
-            midnight = tz.localize(datetime.combine(now + timedelta(days=1), dt_time(0, 0, 0, 0)))
-            await sleep((midnight - now).seconds + 20)
+        await self.bot.scheduler.add(ctx, "motivate", daily=1, nick=nick)
+        await ctx.send(f"**{nick}** Alright.")
 
     @command()
     async def motivate(self, ctx, *, nick: IsMyNick):
@@ -660,13 +648,11 @@ class War(Cog):
                     return await ctx.send(
                         f"**{nick}**\n" + "\n".join(checking) + "\n- Successfully motivated 5 players.")
                 tree = await self.bot.get_content(f'{URL}profile.html?id={citizenId}', return_tree=True)
-                today = int(tree.xpath('//*[@class="sidebar-clock"]/b/text()')[-1].split()[-1])
-                birthday = int(
-                    tree.xpath(f'//*[@class="profile-row" and span = "Birthday"]/span/text()')[0].split()[-1])
-                if today - birthday > 3:
+                age, can_motivate = self.new_citizen(tree)
+                if age > 3:
                     return await ctx.send(f"**{nick}** Checked all new players")
                 checking.append(f"Checking <{URL}profile.html?id={citizenId}>")
-                if tree.xpath('//*[@id="motivateCitizenButton"]'):
+                if can_motivate:
                     for num in storage.values():
                         payload = {'type': num, "submit": "Motivate", "id": citizenId}
                         tree, url = await self.bot.get_content(f"{URL}motivateCitizen.html?id={citizenId}", data=payload, return_tree="both")
@@ -707,8 +693,10 @@ class War(Cog):
                 defender_score, attacker_score = api['defenderScore'], api['attackerScore']
                 await sleep(api["hoursRemaining"] * 3600 + api["minutesRemaining"] * 60 + api["secondsRemaining"])
 
-        elif delay_or_battle_link:
-            await sleep(int(delay_or_battle_link))
+        elif int(delay_or_battle_link or 0):
+            job_id = await self.bot.scheduler.add(ctx, str(ctx.command), country_or_region_id, "0",
+                                                  delay=int(delay_or_battle_link), nick=nick)
+            return await ctx.send(f"**{nick}** Scheduled in {delay_or_battle_link} seconds (`.cancel {job_id} {nick}`).")
 
         if action == "attack":
             payload = {'action': "ATTACK_REGION", 'regionId': country_or_region_id, 'attackButton': "Attack"}
@@ -776,8 +764,7 @@ class War(Cog):
     async def supply(self, ctx, amount: int, quality: Optional[Quality], product: Product, *, nick: IsMyNick):
         """Taking a specific product from MU storage."""
         URL = f"https://{ctx.channel.name}.e-sim.org/"
-        tree = await self.bot.get_content(URL + "militaryUnitStorage.html", return_tree=True)
-        my_id = str(tree.xpath('//*[@id="userName"]/@href')[0]).split("=")[1]
+        my_id = await self.bot.citizens.my_id(ctx.channel.name)
         payload = {'product': f"{quality or 5}-{product}", 'quantity': amount,
                    "reason": " ", "citizen1": my_id, "submit": "Donate"}
         url = await self.bot.get_content(URL + "militaryUnitStorage.html", data=payload)
@@ -813,25 +800,23 @@ class War(Cog):
         * If `nick` contains more than 1 word - it must be within quotes.
         """
         URL = f"https://{ctx.channel.name}.e-sim.org/"
-        api_citizen = await self.bot.get_content(f'{URL}apiCitizenByName.html?name={nick.lower()}')
+        api_citizen = await self.bot.citizens.get(ctx.channel.name, nick, volatile=False)
         battle_link = f"{URL}battle.html?id={battle}"
+        battle_state = self.bot.battles.get(ctx.channel.name, battle, start_time)
         while not self.bot.should_break(ctx):
-            r = await self.bot.get_content(battle_link.replace("battle", "apiBattles").replace("id", "battleId"))
-            if 8 in (r['defenderScore'], r['attackerScore']):
+            await battle_state.current()
+            if battle_state.is_over:
                 break
-            time_till_round_end = r["hoursRemaining"] * 3600 + r["minutesRemaining"] * 60 + r["secondsRemaining"]
-            await ctx.send(f"**{nick}** Sleeping for {time_till_round_end - start_time} seconds :zzz:")
-            await sleep(time_till_round_end - start_time)
+            await ctx.send(f"**{nick}** Sleeping for {round(battle_state.seconds_left) - start_time} seconds :zzz:")
+            r = await battle_state.round_end(start_time)
             await ctx.send(f"**{nick}** T{round(start_time / 60, 1)} at <{battle_link}&round={r['currentRound']}>")
             start = time.time()
             tree = await self.bot.get_content(battle_link, return_tree=True)
-            hidden_id = tree.xpath("//*[@id='battleRoundId']")[0].value
+            round_id = get_round_id(tree)
             while time.time() - start < start_time:
                 if self.bot.should_break(ctx):
                     return
-                battle_score = await self.bot.get_content(
-                    f'{URL}battleScore.html?id={hidden_id}&at={api_citizen["id"]}&ci={api_citizen["citizenshipId"]}&premium=1',
-                    return_type="json")
+                battle_score = await battle_state.get_score(round_id, api_citizen)
                 if battle_score["remainingTimeInSeconds"] <= 0:
                     break
                 my_side = int(battle_score[f"{side}Score"].replace(",", ""))
@@ -0,0 +1,65 @@
+"""Several game accounts in one bot process.
+
+The first account is the classic `nick` / `pw` config. More accounts can be added with
+`"accounts": [{"nick": "...", "pw": "...", "alpha": "other nick", "alpha_pw": "other pw"}, ...]` at config.json.
+The account of the running command is kept in a context variable (set by `Converters.IsMyNick`),
+so `utils.my_nick`, the sessions and the logins of that command (and the tasks it creates) use its account."""
+from contextvars import ContextVar
+import json
+import os
+
+
+class Account:
+    """`settings` has "nick", "pw" and optional "<server>" / "<server>_pw" overrides
+    (the classic account uses os.environ itself, so `.config` changes apply immediately)"""
+    __slots__ = ("settings", )
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    @property
+    def nick(self) -> str:
+        return self.settings["nick"]
+
+    def nick_at(self, server) -> str:
+        return self.settings.get(server, self.nick)
+
+    def password_at(self, server) -> str:
+        return self.settings.get(server + "_pw", self.settings["pw"])
+
+    def __repr__(self):
+        return f"Account({self.nick!r})"
+
+
+_accounts = []
+_current = ContextVar("account", default=None)
+
+
+def all_accounts() -> list:
+    if not _accounts:
+        _accounts.append(Account(os.environ))
+        _accounts.extend(Account(settings) for settings in json.loads(os.environ.get("accounts", "[]")))
+    return _accounts
+
+
+def current() -> Account:
+    """The account of the running command (the first account outside of commands)"""
+    return _current.get() or all_accounts()[0]
+
+
+def use(account):
+    """Sets the account of the running task (and of the tasks it will create)"""
+    _current.set(account)
+
+
+def find(server, nick):
+    nick = nick.replace('"', "").strip().lower()
+    return next((account for account in all_accounts() if account.nick_at(server).lower() == nick), None)
+
+
+def matching(server, nick) -> list:
+    """All the accounts for "all", otherwise the account with this nick at this server (if any)"""
+    if nick.strip().lower() == "all":
+        return list(all_accounts())
+    account = find(server, nick)
+    return [account] if account else []
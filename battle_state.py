@@ -0,0 +1,171 @@
+from asyncio import Event, TimeoutError, ensure_future, shield, sleep, wait_for
+import time
+
+
+class Score:
+    """battleScore of one round, as seen by one citizen"""
+    __slots__ = ("link", "data", "at", "waiters", "fetch")
+
+    def __init__(self, link):
+        self.link = link
+        self.data = None
+        self.at = 0.0
+        self.waiters = 0
+        self.fetch = None  # the request in flight, shared by its waiters
+
+
+class BattleState:
+    """The latest known state of one battle, shared by all the commands that follow it.
+
+    The poller refreshes `api` (apiBattles) slowly at the beginning of the round and every few seconds
+    at the last `fast_window` seconds. battleScore is only fetched on demand (`get_score`)."""
+
+    def __init__(self, poller, server, battle_id):
+        self._poller = poller
+        self.server = server
+        self.battle_id = battle_id
+        self.api = None
+        self.scores = {}  # (round id, citizen id): Score
+        self.fast_window = 0
+        self.updated_at = 0.0
+        self.last_used = time.monotonic()
+        self.waiters = 0
+        self.error = None
+        self.task = None
+        self._changed = Event()
+
+    @property
+    def seconds_left(self) -> float:
+        """Seconds till the end of the current round"""
+        if self.api is None:
+            return 0
+        left = self.api["hoursRemaining"] * 3600 + self.api["minutesRemaining"] * 60 + self.api["secondsRemaining"]
+        return left - (time.monotonic() - self.updated_at)
+
+    @property
+    def is_over(self) -> bool:
+        return self.api is not None and 8 in (self.api['attackerScore'], self.api['defenderScore'])
+
+    def notify(self):
+        event, self._changed = self._changed, Event()
+        event.set()
+
+    def _touch(self):
+        self.last_used = time.monotonic()
+        self._poller.ensure_running(self)
+
+    async def changed(self, timeout=None):
+        """Waits for the next poll (or for `timeout` seconds)"""
+        self._touch()
+        self.waiters += 1
+        try:
+            await wait_for(self._changed.wait(), timeout)
+        except TimeoutError:
+            pass
+        finally:
+            self.waiters -= 1
+            self.last_used = time.monotonic()
+        if self.error is not None:
+            raise self.error
+
+    async def current(self) -> dict:
+        """The latest apiBattles"""
+        self._touch()
+        if self.api is None:
+            await self.changed()
+        return self.api
+
+    async def round_end(self, seconds) -> dict:
+        """Waits until there are `seconds` (or less) left in the current round, and returns the latest apiBattles"""
+        await self.current()
+        while self.seconds_left > seconds and not self.is_over:
+            await self.changed(self.seconds_left - seconds)
+        return self.api
+
+    async def get_score(self, round_id, api_citizen) -> dict:
+        """A fresh battleScore of the given round for the given citizen (only battleScore is fetched).
+        Concurrent calls with the same round and citizen share one request"""
+        self.last_used = time.monotonic()
+        key = (int(round_id), api_citizen["id"])
+        score = self.scores.get(key)
+        if score is None:
+            for old in [k for k, v in self.scores.items() if k[0] != key[0] and not v.waiters]:
+                del self.scores[old]  # previous rounds
+            score = self.scores[key] = Score(f"https://{self.server}.e-sim.org/battleScore.html?id={round_id}"
+                                             f"&at={api_citizen['id']}&ci={api_citizen['citizenshipId']}&premium=1")
+        if score.fetch is None or score.fetch.done():
+            score.fetch = ensure_future(self._poller.bot.get_content(score.link, return_type="json"))
+        score.waiters += 1
+        try:
+            score.data = await shield(score.fetch)
+        finally:
+            score.waiters -= 1
+            if not score.waiters and not score.fetch.done():
+                score.fetch.cancel()  # everyone gave up
+        score.at = time.monotonic()
+        return score.data
+
+
+class BattlePoller:
+    """Polls every followed battle once, no matter how many commands follow it.
+
+    `get` only registers the battle; its poller starts when someone waits for it (`current`, `changed`,
+    `round_end`) and stops (and forgets the battle) after `idle_timeout` seconds without users.
+    The poller task runs with the account (context) of the command that started it."""
+
+    def __init__(self, bot, fast_interval=2, max_interval=60, idle_timeout=120):
+        self.bot = bot
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.idle_timeout = idle_timeout
+        self._states = {}
+
+    def get(self, server, battle_id, fast_window=0) -> BattleState:
+        key = (server, int(battle_id))
+        if key not in self._states:
+            self._forget_idle()
+            self._states[key] = BattleState(self, server, int(battle_id))
+        state = self._states[key]
+        state.fast_window = max(state.fast_window, fast_window)
+        state.last_used = time.monotonic()
+        return state
+
+    def ensure_running(self, state):
+        if state.task is None or state.task.done():
+            state.error = None
+            self._states.setdefault((state.server, state.battle_id), state)
+            state.task = self.bot.loop.create_task(self._poll(state))
+
+    def _forget_idle(self):
+        """Drops the battles that were never polled (or stopped) and weren't used lately"""
+        now = time.monotonic()
+        for key, state in list(self._states.items()):
+            if (state.task is None or state.task.done()) and now - state.last_used > self.idle_timeout:
+                del self._states[key]
+
+    def _interval(self, state) -> float:
+        left = state.seconds_left - state.fast_window
+        if left <= self.fast_interval:
+            return self.fast_interval
+        return min(self.max_interval, max(self.fast_interval, left / 2))
+
+    async def _poll(self, state):
+        URL = f"https://{state.server}.e-sim.org/"
+        errors = 0
+        while state.waiters or time.monotonic() - state.last_used < self.idle_timeout:
+            try:
+                state.api = await self.bot.get_content(f"{URL}apiBattles.html?battleId={state.battle_id}")
+                state.updated_at = time.monotonic()
+                errors = 0
+                state.notify()
+            except Exception as error:
+                errors += 1  # the waiters keep waiting (they'd get no api), unless it's the last try
+                if errors >= 5:
+                    state.error = error
+                    state.notify()
+                    break
+            if state.is_over:
+                break
+            await sleep(self._interval(state) if not errors else 5)
+        if self._states.get((state.server, state.battle_id)) is state:
+            del self._states[(state.server, state.battle_id)]
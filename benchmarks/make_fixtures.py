@@ -0,0 +1,149 @@
+"""Writes the benchmark fixtures.
+
+By default the pages are synthesized: they have the markup that the bot's XPaths read, padded with a menu,
+sidebar and scripts to the size of the real pages. For numbers closer to production, record a real session
+(`"record_file"` at config.json, see transport.py) and run `python benchmarks/make_fixtures.py --from-record FILE`,
+which takes the last recorded response of every fixture instead."""
+from argparse import ArgumentParser
+import gzip
+import json
+import os
+import random
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# fixture: the recorded pages that can replace it (see --from-record)
+RECORDED = {"battle.html": ("GET", "battle.html"),
+            "fight.html": ("POST", "fight"),
+            "storage_product.html": ("GET", "storageType=PRODUCT"),
+            "storage_equipment.html": ("GET", "storageType=EQUIPMENT"),
+            "monetary_market.html": ("GET", "monetaryMarket.html"),
+            "auctions.html": ("GET", "auctions.html"),
+            "notifications.html": ("GET", "notifications.html"),
+            "profile.html": ("GET", "profile.html"),
+            "apiFights.json": ("GET", "apiFights.html")}
+
+
+def layout(body, size=60_000):
+    """A page with the usual menus and scripts around `body`"""
+    menu = "".join(f"<li><a href='page{i}.html'>Menu item {i}</a><ul>" + "".join(
+        f"<li><a href='page{i}_{j}.html'>Sub item {j}</a></li>" for j in range(8)) + "</ul></li>" for i in range(12))
+    sidebar = ("<div class='sidebar-clock'><b>12:00</b> <b>Day 2500</b></div>"
+               "<div class='sidebar-money'><b>1234.56</b></div>"
+               "<div id='userMenu'><div><div>a</div><div>b</div><div>c</div><div><div><b>1234.56</b></div></div></div></div>")
+    page = (f"<html><head><title>e-sim</title><script>var config = {{a: 1}};</script></head><body>"
+            f"<div id='menu'><ul>{menu}</ul></div><div id='sidebar'>{sidebar}</div>"
+            f"<div id='esim-layout'>{body}</div>")
+    filler = "<div class='footer'><p>" + "Lorem ipsum dolor sit amet. " * 20 + "</p></div>"
+    while len(page) < size:
+        page += filler
+    return page + "</body></html>"
+
+
+def battle():
+    weapons = "".join(f"<div id='Q{q}WeaponStock'>{q * 123}</div>" for q in range(1, 6))
+    tops = "".join(f"<div id='top{side}{i}'><div><div><a href='profile.html?id={i}'>Top {side} {i}</a></div>"
+                   f"<div>{(6 - i) * 123_456:,}</div></div></div>" for side in ("Attacker", "Defender") for i in range(1, 6))
+    body = (f"<div id='actualHealth'>85.5</div><div id='foodLimit2'>12</div><div id='giftLimit2'>9</div>"
+            f"<div id='sfoodQ5'>450</div><div id='sgiftQ5'>320</div><input id='battleRoundId' value='123456'/>"
+            f"<div id='attackerScore'>3</div><div id='defenderScore'>5</div>{weapons}{tops}"
+            "<script>var a = 1;</script><script>var b = 2;</script>"
+            "<script>$.ajax({url: \"fightShooting.html\", data: 'weaponQuality=5&ip=10.0.0.1&token=abcdef'});</script>")
+    return layout(body, 120_000)
+
+
+def fight():
+    return ("<div class='fightResponse'><div id='healthUpdate'>35.0 hp</div>"
+            "<div class='damage'>You've done <span id='DamageDone'>12,345</span> damage</div>"
+            "<div class='weapons'>Q5 weapons: 1,234</div></div>")
+
+
+def storage_product():
+    products = [("Weapon", "q5"), ("Food", "q5"), ("Gift", "q5"), ("Ticket", "q5"), ("Weapon", "q1"),
+                ("Iron", ""), ("Grain", ""), ("Oil", ""), ("Stone", ""), ("Wood", ""), ("Diamonds", "")]
+    body = "".join(f"<div class='storage'><div>{random.randint(1, 5000)}</div><div>"
+                   f"<img src='//cdn.e-sim.org//img/productIcons/{name}.png'/>"
+                   + (f"<img src='//cdn.e-sim.org//img/productIcons/{quality}.png'/>" if quality else "") +
+                   "</div></div>" for name, quality in products)
+    return layout(body, 80_000)
+
+
+def storage_equipment(items=200):
+    parameters = ("Increased damage by 5.5%", "Chance to avoid damage by 3.2%", "Increased maximum damage by 4%",
+                  "Increased critical hit chance by 2.1%", "Miss chance reduction by 3%")
+    body = "".join(f"<div id='cell{ID}'><a href='showEquipment.html?id={ID}'>#{ID}</a><b>Q{random.randint(1, 7)} Helmet</b>"
+                   f"<br/>x<br/>y<br/>{random.choice(parameters)}<br/>{random.choice(parameters)}</div>"
+                   for ID in range(100_000, 100_000 + items))
+    return layout(body, 150_000)
+
+
+def monetary_market(offers=20):
+    rows = "".join(f"<tr><td><a href='profile.html?id={i}'>Seller {i}</a></td><td><b>{round(random.uniform(1, 500), 2)}</b></td>"
+                   f"<td><b>{round(0.01 + i / 1000, 4)}</b></td><td><form><input name='action' value='buy'/>"
+                   f"<input name='id' value='{5000 + i}'/><input name='ammount'/></form></td></tr>" for i in range(offers))
+    return layout(f"<table><tr><th>Seller</th><th>Amount</th><th>Ratio</th><th>Buy</th></tr>{rows}</table>")
+
+
+def auctions(count=40):
+    rows = "".join(f"<tr><td><a>Seller {i}</a></td><td><a>Buyer {i}</a></td><td><b>Q5 Personal Helmet</b><br/>a<br/>b"
+                   f"<br/>c<br/>d<br/>Increased damage by 5%<br/>Chance to avoid damage by 3%</td>"
+                   f"<td><b>{100 + i}.5</b></td><td><a href='auction.html?id={i}'>bid</a></td><td><span>01:{i:02}:00</span></td></tr>"
+                   for i in range(count))
+    return layout(f"<table><tr><th>h</th></tr>{rows}</table>")
+
+
+def notifications(count=20):
+    rows = "".join(f"<tr><td>{i}</td><td><a href='profile.html?id={i}'>Citizen {i}</a> has offered you to sign "
+                   f"<a href='contract.html?id={i}'>contract</a>. Please read it carefully</td><td>Day 2500 12:{i:02}</td></tr>"
+                   for i in range(count))
+    return layout(f"<table><tr><th>h</th></tr>{rows}</table>")
+
+
+def profile():
+    # War.motivate reads the first span of the row that has a "Birthday" span
+    return layout("<div class='profile-row'><span>Day 2498</span><span>Birthday</span></div>"
+                  "<div class='profile-row'><span>Level</span><span>5</span></div><a id='motivateCitizenButton'>Motivate</a>")
+
+
+def api_fights(hits=3000):
+    return json.dumps([{"citizenId": random.randint(1, 300), "damage": random.randint(1000, 60000),
+                        "defenderSide": random.random() < 0.5, "weapon": 5, "berserk": True,
+                        "time": "01-01-2022 12:00:00:000", "militaryUnit": random.randint(1, 50)}
+                       for _ in range(hits)])
+
+
+SYNTHESIZED = {"battle.html": battle, "fight.html": fight, "storage_product.html": storage_product,
+               "storage_equipment.html": storage_equipment, "monetary_market.html": monetary_market,
+               "auctions.html": auctions, "notifications.html": notifications, "profile.html": profile,
+               "apiFights.json": api_fights}
+
+
+def from_record(filename) -> dict:
+    pages = {}
+    with gzip.open(filename, "rt", encoding="utf-8") as file:
+        for line in file:
+            record = json.loads(line)
+            for fixture, (method, pattern) in RECORDED.items():
+                if record["key"].startswith(method) and pattern in record["key"].split()[1] and record["status"] == 200:
+                    pages[fixture] = record["body"]
+    return pages
+
+
+def main():
+    parser = ArgumentParser(description="Writes the benchmark fixtures")
+    parser.add_argument("--from-record", metavar="FILE", help="take the pages from a recorded session")
+    args = parser.parse_args()
+    random.seed(0)
+    pages = {name: make() for name, make in SYNTHESIZED.items()}
+    if args.from_record:
+        recorded = from_record(args.from_record)
+        print(f"Recorded: {', '.join(recorded) or 'nothing'}")
+        pages.update(recorded)
+    os.makedirs(FIXTURES, exist_ok=True)
+    for name, page in pages.items():
+        with open(os.path.join(FIXTURES, name), "w", encoding="utf-8") as file:
+            file.write(page)
+
+
+if __name__ == "__main__":
+    main()
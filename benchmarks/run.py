@@ -0,0 +1,162 @@
+"""Parser microbenchmarks: every extraction that the cogs do on the fixtures (see make_fixtures.py).
+
+python benchmarks/run.py                      # ops/sec and peak memory of every case
+python benchmarks/run.py --save base.json     # keep a baseline
+python benchmarks/run.py --compare base.json  # and compare to it later"""
+from argparse import ArgumentParser
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml.html import fromstring  # noqa: E402
+
+from extractors import BattlePage, FightResult, StoragePage, get_damage, get_health  # noqa: E402
+from Info import Info  # noqa: E402
+from orderbook import OrderBook  # noqa: E402
+from Social import Social  # noqa: E402
+from War import War  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+URL = "https://alpha.e-sim.org/"
+
+
+def _sync(coroutine):
+    """Runs a coroutine that never awaits (like War.get_fight_data)"""
+    try:
+        coroutine.send(None)
+    except StopIteration as result:
+        return result.value
+    raise RuntimeError("the coroutine awaited something")
+
+
+def battle_page(text):
+    """War.fight / hunt: health, limits, storage, weapons and the fight form"""
+    tree = fromstring(text)
+    return BattlePage.from_tree(tree), _sync(War.get_fight_data(URL, tree, 5, "attacker"))
+
+
+def battle_top_hitters(text):
+    """War.hunt_battle: score and top hitters"""
+    tree = fromstring(text)
+    return BattlePage.top_hitter(tree, "Attacker"), BattlePage.top_hitter(tree, "Defender")
+
+
+def fight_response(text):
+    """Every hit (fast path)"""
+    return FightResult(text)
+
+
+def fight_response_tree(text):
+    """Every hit, with a full DOM (the path of unusual responses)"""
+    tree = fromstring(text)
+    return get_health(tree), get_damage(tree)
+
+
+def storage_product(text):
+    """Info.inv"""
+    return StoragePage.from_tree(fromstring(text))
+
+
+def storage_equipment(text):
+    """Info.eqs"""
+    return Info.eqs_embed(URL, "nick", fromstring(text))
+
+
+def monetary_market(text):
+    """Eco.cc / Eco.buy"""
+    return OrderBook.from_tree(fromstring(text)).plan(1000)
+
+
+def auctions(text):
+    """Info.auctions"""
+    return Info.auctions_embed(URL, fromstring(text))
+
+
+def notifications(text):
+    """Social.read (the parsing part)"""
+    return Social.notifications(fromstring(text), 20)
+
+
+def profile(text):
+    """War.motivate (the parsing part)"""
+    return War.new_citizen(fromstring(text))
+
+
+def api_fights(text):
+    """War.hunt: damage per citizen and side"""
+    defender, attacker = {}, {}
+    for hit in json.loads(text):
+        side = defender if hit['defenderSide'] else attacker
+        side[hit['citizenId']] = side.get(hit['citizenId'], 0) + hit['damage']
+    return defender, attacker
+
+
+CASES = [("battle page", "battle.html", battle_page),
+         ("battle top hitters", "battle.html", battle_top_hitters),
+         ("fight response", "fight.html", fight_response),
+         ("fight response (DOM)", "fight.html", fight_response_tree),
+         ("product storage", "storage_product.html", storage_product),
+         ("equipment storage", "storage_equipment.html", storage_equipment),
+         ("monetary market", "monetary_market.html", monetary_market),
+         ("auctions", "auctions.html", auctions),
+         ("notifications", "notifications.html", notifications),
+         ("profile", "profile.html", profile),
+         ("apiFights", "apiFights.json", api_fights)]
+
+
+def measure(func, text, seconds, memory_runs=5) -> dict:
+    func(text)  # warm up
+    ops = 0
+    start = time.perf_counter()
+    while True:
+        func(text)
+        ops += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            break
+    tracemalloc.start()
+    peaks = []
+    for _ in range(memory_runs):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func(text)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return {"ops": ops / elapsed, "us": elapsed / ops * 1e6, "peak_kib": min(peaks) / 1024}
+
+
+def main():
+    parser = ArgumentParser(description="Parser microbenchmarks")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per case")
+    parser.add_argument("-k", dest="filter", default="", help="run only the cases that contain this text")
+    parser.add_argument("--save", metavar="FILE", help="save the results (json)")
+    parser.add_argument("--compare", metavar="FILE", help="compare to saved results")
+    args = parser.parse_args()
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    results = {}
+    print(f"{'case':<24}{'size':>10}{'ops/sec':>12}{'us/op':>12}{'peak KiB':>10}" + ("   vs baseline" if baseline else ""))
+    for name, fixture, func in CASES:
+        if args.filter.lower() not in name.lower():
+            continue
+        with open(os.path.join(FIXTURES, fixture), encoding="utf-8") as file:
+            text = file.read()
+        result = results[name] = measure(func, text, args.seconds)
+        line = f"{name:<24}{len(text):>10,}{result['ops']:>12,.0f}{result['us']:>12,.1f}{result['peak_kib']:>10,.0f}"
+        if name in baseline:
+            line += f"   {result['ops'] / baseline[name]['ops']:.2f}x"
+        print(line)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
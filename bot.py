@@ -1,39 +1,121 @@
-from asyncio import sleep
+import ast
+from asyncio import Semaphore, TimeoutError, ensure_future, gather, shield, sleep
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from importlib.util import find_spec
 import os
 import json
-from traceback import format_exception
+import time
+from traceback import format_exception, print_exc
 
-from aiohttp import ClientSession
+from aiohttp import ClientConnectorError, ClientError
 from discord.ext import commands
 from discord.ext.commands import Bot, errors
+from lxml.etree import ParserError
 from lxml.html import fromstring
 
+import accounts
+from battle_state import BattlePoller
+from cache import API_TTL, STORAGE_CACHE_SIZE, STORAGE_TTL, TTLCache, storage_writes
+from citizens import Citizens
+from extractors import FightResult
+from metrics import Metrics, endpoint_of
+from pacing import Pacer
+from retry import CircuitBreaker, policy_of
+from scheduler import Scheduler
+from sessions import SessionManager
+from transport import Recorder, Replayer
 import utils
 
-
-async def create_session():
-    return ClientSession(headers={"User-Agent": os.environ["headers"]})
-
+STARTED = time.perf_counter()
 config_file = "config.json"
 if config_file in os.listdir():
     with open(config_file, 'r') as file:
         for k, v in json.load(file).items():
             if k not in os.environ:
-                os.environ[k] = v
+                os.environ[k] = v if isinstance(v, str) else json.dumps(v)
 
 utils.initiate_db()
 bot = Bot(command_prefix=".", case_insensitive=True)
 bot.VERSION = "30/05/2022"
 bot.config_file = config_file
-bot.session = bot.loop.run_until_complete(create_session())
+# a local stand-in server (see standin.py) instead of e-sim, for load tests
+bot.game_url = os.environ.get("game_url", "").rstrip("/")
+bot.sessions = SessionManager(headers={"User-Agent": os.environ["headers"]}, unsafe_cookies=bool(bot.game_url))
 bot.should_break_dict = {}
+bot.api_cache = TTLCache()
+bot.storage_cache = TTLCache(STORAGE_CACHE_SIZE)
+bot.fetches = {}  # cache key: the request in flight (concurrent misses share it)
+bot.citizens = Citizens(bot)
+bot.world_maps = {}  # server: world_map.WorldMap (see utils.world_map)
+bot.battles = BattlePoller(bot)
+bot.scheduler = Scheduler(bot)
+bot.breakers = defaultdict(CircuitBreaker)  # server: fails fast while the server is down (see retry.py)
+bot.pacers = defaultdict(Pacer)  # (server, account): the pace of its hits there (see War.hit)
+# parse big pages (battle, storage, notifications...) in threads, so the event loop won't stall
+bot.parse_in_thread = os.environ.get("parse_in_thread", "").lower() in ("1", "true", "yes")
+bot.parse_threshold = int(os.environ.get("parse_threshold", 100_000))  # characters
+bot.parse_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="parser")
+bot.metrics = Metrics()
+# record / replay the game's responses (see transport.py)
+bot.transport = None
+if os.environ.get("record_file"):
+    bot.transport = Recorder(os.environ["record_file"])
+elif os.environ.get("replay_file"):
+    bot.transport = Replayer(os.environ["replay_file"],
+                             delay=os.environ.get("replay_delay", "").lower() in ("1", "true", "yes"))
+
+EXTENSIONS = ("Eco", "Mix", "Social", "War", "Info")
+# load the cogs after login (at a thread, in the background) instead of before it
+bot.lazy_cogs = os.environ.get("lazy_cogs", "").lower() in ("1", "true", "yes")
+bot.cogs_task = None
+if not bot.lazy_cogs:
+    for extension in EXTENSIONS:
+        bot.load_extension(extension)
+    bot.metrics.startup["cogs"] = time.perf_counter() - STARTED
+
+
+def import_dependencies(extension):
+    """Imports the modules that `extension` imports, without running the extension itself
+    (load_extension always executes the extension module again)"""
+    spec = find_spec(extension)
+    for node in ast.parse(spec.loader.get_source(extension)).body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                import_module(alias.name)
+        elif isinstance(node, ast.ImportFrom) and not node.level:
+            import_module(node.module)
+
+
+async def load_cogs():
+    start_time = time.perf_counter()
+    for extension in EXTENSIONS:
+        if extension in bot.extensions:
+            continue
+        try:  # the slow part (discord, lxml...), at a thread
+            await bot.loop.run_in_executor(None, import_dependencies, extension)
+        except Exception:
+            print_exc()  # load_extension imports them anyway
+        try:
+            bot.load_extension(extension)
+        except errors.ExtensionError:
+            print_exc()
+    bot.metrics.startup["cogs"] = time.perf_counter() - start_time
 
-for extension in ("Eco", "Mix", "Social", "War", "Info"):
-    bot.load_extension(extension)
+
+def cogs_loaded():
+    """Starts loading the cogs (once). Await it before using the commands"""
+    if bot.cogs_task is None:
+        bot.cogs_task = bot.loop.create_task(load_cogs())
+    return bot.cogs_task
 
 
 async def start():
     await bot.wait_until_ready()
+    bot.metrics.startup["ready"] = time.perf_counter() - STARTED
+    if bot.lazy_cogs:
+        await cogs_loaded()
     print('Logged in as')
     print(bot.user.name)
 
@@ -42,109 +124,234 @@ async def start():
     if not await utils.is_helper():
         bot.remove_command("help")
 
-    for server, DICT in (await utils.find_one("auto", "work", os.environ['nick'])).items():
-        channel = bot.get_channel(int(DICT["channel_id"]))
-        message = await channel.fetch_message(int(DICT["message_id"]))
-        ctx = await bot.get_context(message)
-        bot.loop.create_task(ctx.invoke(bot.get_command("auto_work"), DICT["work_sessions"], nick=DICT["nick"]))
+    if os.environ.get("metrics_port"):
+        await bot.metrics.serve(int(os.environ["metrics_port"]))
+
+    start_time = time.perf_counter()
+    await bot.scheduler.start()
+    await restore_legacy_jobs()
+    bot.metrics.startup["jobs"] = time.perf_counter() - start_time
+    print(f"Ready after {bot.metrics.startup['ready']:.1f}s, "
+          f"{len(bot.scheduler.jobs)} scheduled jobs loaded in {bot.metrics.startup['jobs']:.2f}s")
+
+
+async def restore_legacy_jobs(limit=10):
+    """Older versions saved auto_work / auto_motivate as {server: {channel_id, message_id, nick, ...}}.
+    Those become scheduler jobs (with the saved ids, so no message is fetched), and the old entries are deleted."""
+    semaphore = Semaphore(limit)
 
-    for server, DICT in (await utils.find_one("auto", "motivate", os.environ['nick'])).items():
-        channel = bot.get_channel(int(DICT["channel_id"]))
-        message = await channel.fetch_message(int(DICT["message_id"]))
-        ctx = await bot.get_context(message)
-        bot.loop.create_task(ctx.invoke(bot.get_command("auto_motivate"), nick=DICT["nick"]))
+    async def restore(account, name):
+        async with semaphore:
+            for server, DICT in (await utils.find_one("auto", name, account.nick)).items():
+                await bot.scheduler.add_at(server, DICT["channel_id"], DICT["message_id"], account.nick, name,
+                                           name="auto_" + name, daily=int(DICT.get("work_sessions", 1)),
+                                           nick=DICT["nick"])
+            await utils.delete_one("auto", name, account.nick)
+
+    await gather(*(restore(account, name) for account in accounts.all_accounts() for name in ("work", "motivate")))
 
 
 def should_break(ctx, initiate=True):
-    server = ctx.channel.name
+    key = (ctx.channel.name, accounts.current().nick)
     cmd = str(ctx.command)
-    res = bot.should_break_dict.get(server, {}).get(cmd)
+    res = bot.should_break_dict.get(key, {}).get(cmd)
     if res and initiate:
-        bot.should_break_dict[server][cmd] = False
+        bot.should_break_dict[key][cmd] = False
     return res
 
 
-async def inner_get_content(link, data=None, return_tree=False, return_type=""):
+def game_link(link, server):
+    """The real link, or its stand-in server link (`game_url`)"""
+    if not bot.game_url:
+        return link
+    return link.replace(f"https://{server}.e-sim.org/", f"{bot.game_url}/{server}/", 1)
+
+
+def get_session(server, account):
+    session = bot.sessions.get(server, account)
+    return bot.transport.wrap(session, account) if bot.transport else session
+
+
+async def parse_html(text):
+    start = time.perf_counter()
+    offloaded = bot.parse_in_thread and len(text) >= bot.parse_threshold
+    if offloaded:
+        tree = await bot.loop.run_in_executor(bot.parse_executor, fromstring, text)
+    else:
+        tree = fromstring(text)
+    bot.metrics.observe_parse(time.perf_counter() - start, offloaded)
+    return tree
+
+
+async def inner_get_content(link, server, data=None, return_tree=False, return_type=""):
     method = "get" if data is None else "post"
     if not return_type:
         return_type = "json" if "api" in link else "html"
-    if bot.session.closed:
-        bot.session = await create_session()
-    for _ in range(5):
+    session = get_session(server, accounts.current().nick)
+    endpoint = endpoint_of(link)
+    policy = policy_of(method, return_type)
+    breaker = bot.breakers[server]
+    outcome = None
+    for attempt in range(policy.attempts):
+        if attempt:
+            bot.metrics.observe_retry(server, endpoint, outcome)
+            await sleep(policy.delay(attempt))
+        breaker.check(server)
+        start = time.perf_counter()
+        outcome = None
         try:
-            async with bot.session.get(link, ssl=True) if method == "get" else \
-                    bot.session.post(link, data=data, ssl=True) as respond:
+            async with session.get(game_link(link, server), ssl=True) if method == "get" else \
+                    session.post(game_link(link, server), data=data, ssl=True) as respond:
+                outcome = respond.status
                 if "google.com" in str(respond.url) or respond.status == 403:
-                    await sleep(5)
-                    continue
+                    outcome = "blocked"
 
-                if any(t in str(respond.url) for t in ("notLoggedIn", "error")):
+                elif any(t in str(respond.url) for t in ("notLoggedIn", "error")):
                     raise RuntimeError("notLoggedIn")
 
-                if respond.status == 200:
+                elif respond.status == 200:
                     if return_type == "json":
                         try:
                             api = await respond.json(content_type=None)
-                        except:
-                            await sleep(5)
-                            continue
-                        if "error" in api:
-                            raise RuntimeError(api["error"])
-                        return api if "apiBattles" not in link else api[0]
+                        except ValueError:
+                            api = None
+                            outcome = "bad_json"
+                        if api is not None:
+                            if "error" in api:
+                                raise RuntimeError(api["error"])
+                            return api if "apiBattles" not in link else api[0]
+                    elif return_type == "fight":
+                        # fast path for hits: regex instead of a full DOM
+                        result = FightResult(await respond.text(encoding='utf-8'))
+                        if "login.html" in result.text and any(
+                                "login.html" in x.action for x in result.tree.xpath('//*[@id="command"]')):
+                            raise RuntimeError("notLoggedIn")
+                        return result
                     else:
                         try:
-                            tree = fromstring(await respond.text(encoding='utf-8'))
+                            tree = await parse_html(await respond.text(encoding='utf-8'))
                         except:
-                            tree = fromstring(await respond.text(encoding='utf-8'))[1:]
+                            tree = (await parse_html(await respond.text(encoding='utf-8')))[1:]
                         logged = tree.xpath('//*[@id="command"]')
                         if any("login.html" in x.action for x in logged):
                             raise RuntimeError("notLoggedIn")
                         if isinstance(return_tree, str):
                             return tree, str(respond.url)
                         return tree if return_tree else str(respond.url)
-                else:
-                    await sleep(5)
-        except Exception as e:
-            if type(e) in (RuntimeError, OSError):
-                raise e
-            await sleep(5)
+        except ClientConnectorError:
+            outcome = "not_sent"
+        except (ClientError, TimeoutError):
+            outcome = "error"
+        except ParserError:  # empty page
+            outcome = "bad_html"
+        finally:
+            if outcome is None:  # cancelled (or an unexpected error): says nothing about the server
+                breaker.release()
+            else:
+                bot.metrics.observe_request(server, endpoint, method, outcome, time.perf_counter() - start)
+                breaker.record(outcome)
+        if not policy.should_retry(outcome):
+            break
 
     raise OSError(link)
 
 
+def invalidate_cache(server=None, endpoint=None):
+    """Drops cached api responses and storage pages (e.g. `invalidate_cache("alpha", "apiMap.html")`)"""
+    bot.api_cache.invalidate(server, endpoint)
+    bot.storage_cache.invalidate(server, endpoint)
+    for key in [key for key in bot.fetches if server in (None, key[0]) and endpoint in (None, key[1])]:
+        del bot.fetches[key]  # their (old) results won't be cached
+
+
+async def cached_content(cache, key, ttl, link, server, return_tree, return_type):
+    """`cache[key]`, or one fetch of `link` shared by everyone who misses it meanwhile.
+    The cached object itself is returned (no copy), so it must not be mutated"""
+    value = cache.get(key)
+    if value is not None:
+        return value
+    fetch = bot.fetches.get(key)
+    if fetch is None:
+        fetch = bot.fetches[key] = ensure_future(fetch_content(link, server, None, return_tree, return_type))
+
+        def done(_):
+            if bot.fetches.get(key) is fetch:  # not invalidated meanwhile
+                del bot.fetches[key]
+                if not fetch.cancelled() and fetch.exception() is None:
+                    cache.set(key, fetch.result(), ttl)
+        fetch.add_done_callback(done)
+    return await shield(fetch)
+
+
 async def get_content(link, data=None, return_tree=False, return_type=""):
+    """The cached endpoints (API_TTL, storage pages) return shared objects: don't mutate them"""
     link = link.split("#")[0].replace("http://", "https://")
     server = link.split("https://", 1)[1].split(".e-sim.org", 1)[0]
-    nick = utils.my_nick(server)
+    endpoint = link.split(".e-sim.org/", 1)[-1].split("?", 1)[0]
+    if data is None and endpoint in API_TTL:
+        return await cached_content(bot.api_cache, (server, endpoint, link), API_TTL[endpoint],
+                                    link, server, return_tree, return_type)
+    if endpoint == "storage.html" and "storageType=" in link and data is None and return_tree is True:
+        key = (server, "storage.html?storageType=" + link.split("storageType=")[1].split("&")[0],
+               accounts.current().nick, link)
+        return await cached_content(bot.storage_cache, key, STORAGE_TTL, link, server, return_tree, return_type)
+    if data is not None and endpoint in ("countryLaws.html", "region.html"):
+        # new attacks / RWs change the map
+        invalidate_cache(server, "apiMap.html")
+    try:
+        return await fetch_content(link, server, data, return_tree, return_type)
+    finally:
+        if data is not None:
+            for storage_type in storage_writes(endpoint, return_type):
+                invalidate_cache(server, "storage.html?storageType=" + storage_type)
+            bot.citizens.after_post(server, accounts.current().nick_at(server), endpoint)
+
+
+async def login(server):
+    """Logs in the current account again at the given server only (the other connections are kept alive)"""
+    account = accounts.current()
+    nick = account.nick_at(server)
     URL = f"https://{server}.e-sim.org/"
+    session = get_session(server, account.nick)
+    bot.sessions.clear_cookies(server, account.nick)
+    payload = {'login': nick, 'password': account.password_at(server), "submit": "Login"}
+    async with session.get(game_link(URL, server), ssl=True) as _:
+        async with session.post(game_link(URL + "login.html", server), data=payload, ssl=True) as r:
+            print(r.url)
+            if "index.html?act=login" not in str(r.url):
+                raise RuntimeError(f"{nick} - Failed to login {r.url}")
+    key = (server, account.nick)
+    bot.sessions.logins[key] = bot.sessions.logins.get(key, 0) + 1
+    bot.metrics.observe_login(server)
+
+
+async def fetch_content(link, server, data=None, return_tree=False, return_type=""):
+    account = accounts.current().nick
+    logins = bot.sessions.logins.get((server, account), 0)
     notLoggedIn = False
     tree = None
     try:
-        tree = await inner_get_content(link, data, return_tree, return_type)
+        tree = await inner_get_content(link, server, data, return_tree, return_type)
     except RuntimeError as e:
         if "notLoggedIn" != str(e):
             raise e
         else:
             notLoggedIn = True
     if notLoggedIn:
-        await bot.session.close()
-        bot.session = await create_session()
-
-        payload = {'login': nick, 'password': os.environ.get(server+"_pw", os.environ['pw']), "submit": "Login"}
-        async with bot.session.get(URL, ssl=True) as _:
-            async with bot.session.post(URL + "login.html", data=payload, ssl=True) as r:
-                print(r.url)
-                if "index.html?act=login" not in str(r.url):
-                    raise RuntimeError(f"{nick} - Failed to login {r.url}")
-        tree = await inner_get_content(link, data, return_tree, return_type)
+        async with bot.sessions.login_lock(server, account):
+            if bot.sessions.logins.get((server, account), 0) == logins:  # nobody else logged in meanwhile
+                await login(server)
+        tree = await inner_get_content(link, server, data, return_tree, return_type)
     if tree is None:
-        tree = await inner_get_content(link, data, return_tree, return_type)
+        tree = await inner_get_content(link, server, data, return_tree, return_type)
     return tree
 
 
 @bot.event
 async def on_message(message):
     """Allow other bots to invoke commands"""
+    if bot.lazy_cogs:
+        await cogs_loaded()
     ctx = await bot.get_context(message)
     if ctx.valid:
         await bot.invoke(ctx)
@@ -173,6 +380,7 @@ async def on_command_error(ctx, error):
 
 
 bot.get_content = get_content
+bot.invalidate_cache = invalidate_cache
 bot.should_break = should_break
 if os.environ["TOKEN"] != "PASTE YOUR TOKEN HERE":
     bot.loop.create_task(start())  # startup function
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+import time
+
+# seconds to keep each static api endpoint
+API_TTL = {"apiRegions.html": 6 * 60 * 60,
+           "apiCountries.html": 6 * 60 * 60,
+           "apiMap.html": 10}
+
+# storage.html?storageType=... snapshots, kept until a POST that changes them (or for STORAGE_TTL seconds).
+# They are whole DOMs, so they have their own (small) cache
+STORAGE_TTL = 60
+STORAGE_CACHE_SIZE = 32
+STORAGE_TYPES = ("PRODUCT", "EQUIPMENT", "SPECIAL_ITEM", "MONEY")
+# POST endpoint: the storage types it changes (None = all of them)
+STORAGE_WRITES = {"storage.html": None,
+                  "equipmentAction.html": ("EQUIPMENT", ),
+                  "productMarket.html": ("PRODUCT", "MONEY"),
+                  "monetaryMarket.html": ("MONEY", ),
+                  "militaryUnitStorage.html": ("PRODUCT", ),
+                  "eat.html": ("PRODUCT", ),
+                  "gift.html": ("PRODUCT", ),
+                  "fight.html": ("PRODUCT", ),
+                  "work.html": ("MONEY", ),
+                  "motivateCitizen.html": ("PRODUCT", ),
+                  "auctionAction.html": None,
+                  "travel.html": ("PRODUCT", ),
+                  "food.html": ("PRODUCT", ),
+                  "ticket.html": ("PRODUCT", ),
+                  "medkit.html": ("SPECIAL_ITEM", ),
+                  "betaMissions.html": None,
+                  "contract.html": None}
+
+
+def storage_writes(endpoint, return_type=""):
+    """The storage types that a POST to `endpoint` changes.
+    Hits use weapons whatever the fight endpoint is called (it's taken from the battle page)"""
+    if return_type == "fight":
+        return tuple(set(storage_writes(endpoint)) | {"PRODUCT"})
+    if endpoint.startswith("donate"):
+        return STORAGE_TYPES
+    if endpoint not in STORAGE_WRITES:
+        return ()
+    return STORAGE_WRITES[endpoint] or STORAGE_TYPES
+
+
+class TTLCache:
+    """In-memory cache with a ttl per entry and LRU eviction.
+
+    Keys are tuples of (server, endpoint, ...) so they can be invalidated by server and/or endpoint."""
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl):
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def invalidate(self, server=None, endpoint=None):
+        """Removes all entries of the given server and/or endpoint (everything if both are None)"""
+        for key in list(self._data):
+            if (server is None or key[0] == server) and (endpoint is None or key[1] == endpoint):
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
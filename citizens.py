@@ -0,0 +1,72 @@
+"""Cache of apiCitizenByName.
+
+The identity of a citizen (id, login, citizenship) is kept for IDENTITY_TTL and saved at the "citizens" collection,
+so it survives restarts. The rest (location, level, skills, damage...) is kept in memory for VOLATILE_TTL.
+Our own POSTs that change them (see WRITES) drop the entry of the current account."""
+import time
+
+from cache import TTLCache
+import utils
+
+IDENTITY = ("id", "login", "citizenshipId", "citizenship")
+IDENTITY_TTL = 6 * 60 * 60
+VOLATILE_TTL = 60
+
+# POST endpoint: whether it changes the identity (otherwise only the volatile fields)
+WRITES = {"travel.html": False,
+          "citizenshipApplicationAction.html": True,
+          "militaryUnitsActions.html": False}
+
+
+class Citizens:
+    def __init__(self, bot):
+        self.bot = bot
+        self.volatile = TTLCache()
+        self.identities = {}  # (server, nick): identity + "cached_at"
+
+    async def get(self, server, nick, volatile=True) -> dict:
+        """apiCitizenByName. With `volatile=False` only the IDENTITY fields are guaranteed (usually no request at all)"""
+        nick = nick.lower()
+        if not volatile:
+            identity = await self._identity(server, nick)
+            if identity:
+                return identity
+        citizen = self.volatile.get((server, "citizen", nick))
+        if citizen is None:
+            citizen = await self.bot.get_content(f"https://{server}.e-sim.org/apiCitizenByName.html?name={nick}")
+            if "id" in citizen:
+                self.volatile.set((server, "citizen", nick), citizen, VOLATILE_TTL)
+                await self._save(server, nick, citizen)
+        return citizen
+
+    async def my_id(self, server) -> int:
+        """The citizen id of the current account"""
+        return (await self.get(server, utils.my_nick(server), volatile=False))["id"]
+
+    def invalidate(self, server, nick, identity=False):
+        nick = nick.lower()
+        self.volatile.pop((server, "citizen", nick))
+        if identity:
+            self.identities[(server, nick)] = {}  # don't reload the old one from the db
+
+    def after_post(self, server, nick, endpoint):
+        if endpoint in WRITES:
+            self.invalidate(server, nick, WRITES[endpoint])
+
+    async def _identity(self, server, nick) -> dict:
+        identity = self.identities.get((server, nick))
+        if identity is None:
+            identity = self.identities[(server, nick)] = await utils.find_one(server, "citizens", nick)
+        if identity and identity["cached_at"] + IDENTITY_TTL > time.time():
+            return identity
+        return {}
+
+    async def _save(self, server, nick, citizen):
+        identity = {key: citizen[key] for key in IDENTITY if key in citizen}
+        cached = self.identities.get((server, nick))
+        if cached and cached["cached_at"] + IDENTITY_TTL / 2 > time.time() and \
+                all(cached.get(key) == value for key, value in identity.items()):
+            return  # nothing new to write
+        identity["cached_at"] = time.time()
+        self.identities[(server, nick)] = identity
+        await utils.replace_one(server, "citizens", nick, identity)
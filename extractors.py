@@ -0,0 +1,163 @@
+"""Precompiled XPath queries and small containers for the pages that are parsed the most"""
+from dataclasses import dataclass
+import re
+
+from lxml.etree import XPath
+from lxml.html import fromstring
+
+_actual_health = XPath('//*[@id="actualHealth"]/text()')
+_health_update = XPath('//*[@id="healthUpdate"]/text()')
+_damage_done = XPath('//*[@id="DamageDone"]/text()')
+_food_limit = XPath('//*[@id="foodLimit2"]/text()')
+_gift_limit = XPath('//*[@id="giftLimit2"]/text()')
+_battle_food_storage = XPath('//*[@id="sfoodQ5"]/text()')
+_battle_gift_storage = XPath('//*[@id="sgiftQ5"]/text()')
+_home_food_storage = XPath('//*[@id="foodQ5"]/text()')
+_home_gift_storage = XPath('//*[@id="giftQ5"]/text()')
+_round_id = XPath('//*[@id="battleRoundId"]/@value')
+_weapon_stocks = XPath('//*[starts-with(@id, "Q") and substring(@id, 3) = "WeaponStock"]')
+_score = XPath('//*[@id=$id]/text()')
+_top_name = XPath('//*[@id=$id]//div//a[1]/text()')
+_top_damage = XPath('//*[@id=$id]/div/div[2]/text()')
+_user_gold = XPath('//*[@id="userMenu"]//div//div[4]//div[1]/b/text()')
+_sidebar_gold = XPath('//div[@class="sidebar-money"][1]/b/text()')
+_storage_items = XPath("//div[@class='storage']")
+_storage_icons = XPath("div[2]/img/@src")
+_storage_amount = XPath("div[1]/text()")
+_equipment_ids = XPath('//*[starts-with(@id, "cell")]/a/text()')
+_equipment_names = XPath('//*[starts-with(@id, "cell")]/b/text()')
+
+RAW_MATERIALS = ("iron", "grain", "diamonds", "oil", "stone", "wood")
+
+_health_update_re = re.compile(r"""id=["']healthUpdate["'][^>]*>\s*([\d.,]+)""")
+_damage_done_re = re.compile(r"""id=["']DamageDone["'][^>]*>\s*([\d.,]+)""")
+
+
+def to_int(value) -> int:
+    return int(float(str(value).replace(",", "").strip()))
+
+
+def get_health(tree):
+    """Health after a hit (or from the battle page). None if the page has no health at all"""
+    health = _health_update(tree) or _actual_health(tree)
+    return float(health[0].split()[0]) if health else None
+
+
+def get_damage(tree):
+    """Damage of a hit. None if the hit failed"""
+    damage = _damage_done(tree)
+    return to_int(damage[0]) if damage else None
+
+
+def get_round_id(tree) -> str:
+    return _round_id(tree)[0]
+
+
+def get_food_limit(tree) -> int:
+    return to_int(_food_limit(tree)[0])
+
+
+def get_side_score(tree, side) -> int:
+    return to_int(_score(tree, id=f"{side}Score")[0])
+
+
+def get_equipment(tree) -> list:
+    """[(id, quality)] of the items at the equipment storage"""
+    return [(int(ID.replace("#", "")), int(item.split()[0].replace("Q", "")))
+            for ID, item in zip(_equipment_ids(tree), _equipment_names(tree))]
+
+
+class FightResult:
+    """The response of a single hit, without building a DOM for it.
+
+    `health` and `damage` are None if the hit failed ("Slow down a bit!", "Round is closed" etc.)
+    `tree` is built only when it's needed (unusual responses)."""
+    __slots__ = ("text", "health", "damage", "_tree")
+
+    def __init__(self, text):
+        self.text = text
+        self._tree = None
+        health = _health_update_re.search(text)
+        damage = _damage_done_re.search(text)
+        self.health = float(health.group(1).replace(",", "")) if health else None
+        self.damage = to_int(damage.group(1)) if damage else None
+        if (self.health is None and "healthUpdate" in text) or (self.damage is None and "DamageDone" in text):
+            # unexpected markup, fall back to the full tree
+            self.health = get_health(self.tree)
+            self.damage = get_damage(self.tree)
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = fromstring(self.text)
+        return self._tree
+
+
+@dataclass
+class BattlePage:
+    __slots__ = ("health", "food_limit", "gift_limit", "food_storage", "gift_storage", "round_id", "weapons")
+    health: float
+    food_limit: int
+    gift_limit: int
+    food_storage: int
+    gift_storage: int
+    round_id: str
+    weapons: dict  # quality: stock
+
+    @classmethod
+    def from_tree(cls, tree):
+        return cls(health=float(_actual_health(tree)[0].split()[0]),
+                   food_limit=get_food_limit(tree),
+                   gift_limit=to_int(_gift_limit(tree)[0]),
+                   food_storage=to_int((_battle_food_storage(tree) or [0])[0]),
+                   gift_storage=to_int((_battle_gift_storage(tree) or [0])[0]),
+                   round_id=get_round_id(tree),
+                   weapons={int(x.get("id")[1]): to_int(x.text) for x in _weapon_stocks(tree) if (x.text or "").strip()})
+
+    @staticmethod
+    def top_hitter(tree, side):
+        """(nick, damage) of the top hitter at the given side ("Attacker" / "Defender")"""
+        name = _top_name(tree, id=f"top{side}1")
+        damage = _top_damage(tree, id=f"top{side}1")
+        if not name or not damage:
+            return "None", 0
+        return name[0].strip(), to_int(damage[0])
+
+
+@dataclass
+class HomePage:
+    __slots__ = ("gold", "food_limit", "gift_limit", "food_storage", "gift_storage")
+    gold: str
+    food_limit: int
+    gift_limit: int
+    food_storage: int
+    gift_storage: int
+
+    @classmethod
+    def from_tree(cls, tree):
+        return cls(gold=_user_gold(tree)[0],
+                   food_limit=to_int(_food_limit(tree)[0]),
+                   gift_limit=to_int(_gift_limit(tree)[0]),
+                   food_storage=to_int((_home_food_storage(tree) or [0])[0]),
+                   gift_storage=to_int((_home_gift_storage(tree) or [0])[0]))
+
+
+@dataclass
+class StoragePage:
+    __slots__ = ("gold", "products")
+    gold: str
+    products: dict  # "Q5 Weapon": amount, as shown (e.g. "1,234")
+
+    @classmethod
+    def from_tree(cls, tree):
+        products = {}
+        for item in _storage_items(tree):
+            icons = _storage_icons(item)
+            name = icons[0].replace("//cdn.e-sim.org//img/productIcons/", "").replace(
+                "Rewards/", "").replace(".png", "")
+            if name.lower() in RAW_MATERIALS:
+                quality = ""
+            else:
+                quality = icons[1].replace("//cdn.e-sim.org//img/productIcons/", "").replace(".png", "")
+            products[f"{quality.title()} {name}"] = _storage_amount(item)[0].strip()
+        return cls(gold=(_sidebar_gold(tree) or ["0"])[0], products=products)
@@ -0,0 +1,86 @@
+import json
+import os
+import sqlite3
+
+
+def _json_path(field):
+    return '$."' + field.replace('"', '\\"') + '"'
+
+
+class LocalStore:
+    """SQLite store (WAL mode) for the documents that are kept at MongoDB when `database_url` is set.
+
+    Every write is a single atomic statement, so a crash can't corrupt the file, and a write costs the same
+    no matter how many documents the collection has.
+    Old `{server}_{collection}.json` files are imported the first time their collection is used.
+    The methods are blocking, so they should run at a worker thread (see utils.run_db)."""
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS documents (server TEXT, collection TEXT, id TEXT, data TEXT, "
+                                "PRIMARY KEY (server, collection, id))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS imported (filename TEXT PRIMARY KEY)")
+        self._checked = set()
+
+    def _import_json(self, server, collection):
+        if (server, collection) in self._checked:
+            return
+        self._checked.add((server, collection))
+        filename = f"{server}_{collection}.json"
+        if not os.path.isfile(filename) or self.connection.execute(
+                "SELECT 1 FROM imported WHERE filename = ?", (filename, )).fetchone():
+            return
+        with open(filename, "r") as file:
+            big_dict = json.load(file)
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO documents VALUES (?, ?, ?, ?)",
+                [(server, collection, k, json.dumps(v)) for k, v in big_dict.items()])
+            self.connection.execute("INSERT INTO imported VALUES (?)", (filename, ))
+
+    def find(self, server, collection, filter=None, projection=None, sort=None, limit=50, offset=0) -> list:
+        """One batch of documents.
+        `filter` = {field: value} (equality only), `projection` = [fields], `sort` = field (ascending)"""
+        self._import_json(server, collection)
+        query = "SELECT id, data FROM documents WHERE server = ? AND collection = ?"
+        params = [server, collection]
+        for field, value in (filter or {}).items():
+            if field == "_id":
+                query += " AND id = ?"
+            else:
+                query += " AND json_extract(data, ?) = ?"
+                params.append(_json_path(field))
+            params.append(value)
+        if sort:
+            query += " ORDER BY json_extract(data, ?), id"
+            params.append(_json_path(sort))
+        else:
+            query += " ORDER BY id"
+        query += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        documents = []
+        for ID, data in self.connection.execute(query, params):
+            data = json.loads(data)
+            if projection is not None:
+                data = {k: v for k, v in data.items() if k in projection}
+            documents.append({**data, **{"_id": ID}})
+        return documents
+
+    def find_one(self, server, collection, ID) -> dict:
+        self._import_json(server, collection)
+        row = self.connection.execute("SELECT data FROM documents WHERE server = ? AND collection = ? AND id = ?",
+                                      (server, collection, ID)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def delete_one(self, server, collection, ID):
+        self._import_json(server, collection)
+        self.connection.execute("DELETE FROM documents WHERE server = ? AND collection = ? AND id = ?",
+                                (server, collection, ID))
+
+    def replace_one(self, server, collection, ID, data):
+        self._import_json(server, collection)
+        self.connection.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)",
+                                (server, collection, ID, json.dumps(data)))
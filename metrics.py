@@ -0,0 +1,165 @@
+"""Request counters and latency histograms of every get_content call, per server and endpoint"""
+from asyncio import create_subprocess_exec
+from asyncio.subprocess import DEVNULL, PIPE
+from collections import defaultdict
+import os
+import sys
+
+from aiohttp import web
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds
+
+
+def endpoint_of(link) -> str:
+    """`https://alpha.e-sim.org/battle.html?id=1` -> `battle.html` (the ids are always at the query)"""
+    return link.split(".e-sim.org/", 1)[-1].split("?", 1)[0] or "index"
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for index, bucket in enumerate(BUCKETS):
+            if value <= bucket:
+                break
+        else:
+            index = len(BUCKETS)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q) -> float:
+        """Upper bound of the bucket that holds the q-th quantile"""
+        target = q * self.count
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= target and count:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return 0.0
+
+
+class Metrics:
+    def __init__(self):
+        self.requests = defaultdict(int)  # (server, endpoint, method, outcome): count
+        self.latency = defaultdict(Histogram)  # (server, endpoint): seconds per attempt
+        self.retries = defaultdict(int)  # (server, endpoint, reason): count
+        self.logins = defaultdict(int)  # server: count
+        self.parse = Histogram()
+        self.parse_offloaded = 0
+        self.startup = {}  # phase: seconds (see bot.start)
+
+    def observe_request(self, server, endpoint, method, outcome, seconds):
+        """`outcome` is the status code, "blocked" (403 / google redirect) or "error" (connection errors etc.)"""
+        self.requests[(server, endpoint, method, str(outcome))] += 1
+        self.latency[(server, endpoint)].observe(seconds)
+
+    def observe_retry(self, server, endpoint, reason):
+        self.retries[(server, endpoint, reason)] += 1
+
+    def observe_login(self, server):
+        self.logins[server] += 1
+
+    def observe_parse(self, seconds, offloaded=False):
+        self.parse.observe(seconds)
+        self.parse_offloaded += offloaded
+
+    def summary(self, server=None, top=10) -> str:
+        """Short text report (slowest endpoints first) for discord"""
+        lines = []
+        latency = sorted(((k, v) for k, v in self.latency.items() if server in (None, k[0])),
+                         key=lambda x: x[1].sum, reverse=True)
+        for (srv, endpoint), histogram in latency[:top]:
+            retries = sum(v for k, v in self.retries.items() if k[:2] == (srv, endpoint))
+            lines.append(f"{srv} {endpoint}: {histogram.count} req, avg {histogram.mean:.2f}s, "
+                         f"p95 {histogram.quantile(0.95):.2f}s, max {histogram.max:.2f}s, {retries} retries")
+        blocked = sum(v for k, v in self.requests.items() if k[3] == "blocked" and server in (None, k[0]))
+        errors = sum(v for k, v in self.requests.items() if k[3] == "error" and server in (None, k[0]))
+        logins = sum(v for k, v in self.logins.items() if server in (None, k))
+        lines.append(f"403/google: {blocked}, errors: {errors}, logins: {logins}")
+        lines.append(f"parse: {self.parse.count} pages ({self.parse_offloaded} at threads), "
+                     f"avg {self.parse.mean * 1000:.1f}ms, max {self.parse.max * 1000:.1f}ms")
+        if self.startup:
+            lines.append("startup: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.startup.items()))
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines = ["# TYPE esim_requests_total counter"]
+        for (server, endpoint, method, outcome), value in self.requests.items():
+            lines.append(f'esim_requests_total{{server="{server}",endpoint="{endpoint}",method="{method}",'
+                         f'outcome="{outcome}"}} {value}')
+        lines.append("# TYPE esim_retries_total counter")
+        for (server, endpoint, reason), value in self.retries.items():
+            lines.append(f'esim_retries_total{{server="{server}",endpoint="{endpoint}",reason="{reason}"}} {value}')
+        lines.append("# TYPE esim_logins_total counter")
+        for server, value in self.logins.items():
+            lines.append(f'esim_logins_total{{server="{server}"}} {value}')
+        lines.append("# TYPE esim_request_seconds histogram")
+        for (server, endpoint), histogram in self.latency.items():
+            lines += _histogram_lines("esim_request_seconds", f'server="{server}",endpoint="{endpoint}"', histogram)
+        lines.append("# TYPE esim_parse_seconds histogram")
+        lines += _histogram_lines("esim_parse_seconds", "", self.parse)
+        lines.append("# TYPE esim_parse_offloaded_total counter")
+        lines.append(f"esim_parse_offloaded_total {self.parse_offloaded}")
+        lines.append("# TYPE esim_startup_seconds gauge")
+        for phase, seconds in self.startup.items():
+            lines.append(f'esim_startup_seconds{{phase="{phase}"}} {seconds:.4f}')
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, port, host="127.0.0.1") -> web.AppRunner:
+        """Serves `prometheus()` at http://host:port/metrics"""
+        async def handler(_):
+            return web.Response(text=self.prometheus(), content_type="text/plain")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def _histogram_lines(name, labels, histogram) -> list:
+    lines = []
+    total = 0
+    separator = "," if labels else ""
+    for bucket, count in zip(BUCKETS + ("+Inf", ), histogram.counts):
+        total += count
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{bucket}"}} {total}')
+    labels = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{labels} {histogram.sum}")
+    lines.append(f"{name}_count{labels} {histogram.count}")
+    return lines
+
+
+async def import_report(modules, top=15) -> str:
+    """`python -X importtime` of the given modules (at a new interpreter), the slowest first"""
+    process = await create_subprocess_exec(
+        sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules),
+        stdout=DEVNULL, stderr=PIPE, cwd=os.path.dirname(os.path.abspath(__file__)))
+    _, stderr = await process.communicate()
+    rows = []
+    for line in stderr.decode(errors="replace").splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    if not rows:
+        return stderr.decode(errors="replace")[-1500:] or "Nothing was imported"
+    total = sum(cumulative for _, cumulative, name in rows if not name.startswith("  "))
+    lines = [f"total {total / 1000:.0f}ms ({len(rows)} modules)", f"{'self':>8} {'cumulative':>11}  module"]
+    for self_us, cumulative_us, name in sorted(rows, reverse=True)[:top]:
+        lines.append(f"{self_us / 1000:6.1f}ms {cumulative_us / 1000:9.1f}ms  {name.strip()}")
+    return "\n".join(lines)
@@ -0,0 +1,62 @@
+"""Array-backed order book of the monetary market, so a whole purchase can be planned from a single page"""
+from array import array
+import time
+
+from lxml.etree import XPath
+
+_amounts = XPath("//td[2]//b/text()")
+_prices = XPath("//td[3]//b/text()")
+_ids = XPath("//td[4]//form[1]//input[@value][2]/@value")
+
+
+class OrderBook:
+    """Offers of one currency, cheapest first.
+    `fill` updates the local copy after a successful purchase, so the page has to be fetched again only
+    when a purchase fails, the book is empty or it's older than `max_age` seconds."""
+    __slots__ = ("ids", "amounts", "prices", "fetched_at", "max_age")
+
+    def __init__(self, ids, amounts, prices, max_age=60):
+        order = sorted(range(len(prices)), key=prices.__getitem__)
+        self.ids = [ids[i] for i in order]
+        self.amounts = array("d", (amounts[i] for i in order))
+        self.prices = array("d", (prices[i] for i in order))
+        self.fetched_at = time.monotonic()
+        self.max_age = max_age
+
+    @classmethod
+    def from_tree(cls, tree, max_age=60):
+        prices = [float(x) for x in _prices(tree)]
+        ids = _ids(tree)[:len(prices)]
+        amounts = [float(x) for x in _amounts(tree)[:len(prices)]]
+        length = min(len(ids), len(amounts))
+        return cls(ids[:length], amounts[:length], prices[:length], max_age)
+
+    def __len__(self):
+        return sum(1 for x in self.amounts if x > 0)
+
+    @property
+    def best_price(self) -> float:
+        return next((p for a, p in zip(self.amounts, self.prices) if a > 0), 0.0)
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.fetched_at > self.max_age
+
+    def plan(self, amount, max_price=float("inf")) -> list:
+        """[(offer id, amount, price, cumulative cost)] that buys `amount` coins (or as much as the book allows)"""
+        plan = []
+        cost = 0.0
+        for ID, offer_amount, price in zip(self.ids, self.amounts, self.prices):
+            if amount <= 0 or price > max_price:
+                break
+            quantity = round(min(offer_amount, amount), 2)
+            if quantity <= 0:
+                continue
+            cost += quantity * price
+            plan.append((ID, quantity, price, round(cost, 2)))
+            amount -= quantity
+        return plan
+
+    def fill(self, offer_id, amount):
+        index = self.ids.index(offer_id)
+        self.amounts[index] = max(0.0, round(self.amounts[index] - amount, 2))
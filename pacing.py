@@ -0,0 +1,58 @@
+"""Pacing of the fight requests, one controller per account and server (shared by all its fight loops there).
+
+The game answers "Slow down a bit!" to hits that come too fast. Instead of fixed sleeps, every hit waits for
+its slot (a token bucket of one token that refills at `rate` hits per second), and the rate is learnt (AIMD):
+it grows a little after every accepted hit (quickly, till the first slow-down) and is halved after a slow-down. A round trip time well above the
+fastest one seen means that the server is queueing, so the rate goes down a little instead of up."""
+from asyncio import sleep
+from random import uniform
+import time
+
+
+class Pacer:
+    def __init__(self, rate=2.0, min_rate=0.25, max_rate=8.0, increase=0.05, decrease=0.5, jitter=0.1):
+        self.rate = rate  # hits per second
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.jitter = jitter  # the gaps vary by up to this fraction, so the hits don't look like a metronome
+        self.rtt = None  # moving average (seconds)
+        self.min_rtt = None
+        self.accepted = 0
+        self.slow_start = True  # till the first slow-down, the rate grows by 10% per hit
+        self.slow_downs = 0
+        self._next = 0.0  # time.monotonic() of the next free slot
+        self._decreased_at = 0.0
+
+    async def wait(self) -> float:
+        """Waits for (and takes) the next slot. Returns its time (for `on_slow_down`)"""
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + uniform(1, 1 + self.jitter) / self.rate
+        if slot > now:
+            await sleep(slot - now)
+        return slot
+
+    def on_accepted(self, rtt):
+        self.accepted += 1
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        self.rtt = rtt if self.rtt is None else 0.8 * self.rtt + 0.2 * rtt
+        if self.rtt > 2 * self.min_rtt + 0.1:
+            self.rate = max(self.min_rate, self.rate * 0.95)
+        else:
+            self.rate = min(self.max_rate, self.rate * 1.1 if self.slow_start else self.rate + self.increase)
+
+    def on_slow_down(self, sent_at=None):
+        """`sent_at`: the slot of the rejected hit. The hits that were sent before the last decrease
+        were rejected for the same reason, so they don't decrease the rate again"""
+        self.slow_downs += 1
+        if sent_at is not None and sent_at <= self._decreased_at:
+            return
+        self._decreased_at = time.monotonic()
+        self.slow_start = False
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self._next = max(self._next, time.monotonic() + 1 / self.rate)  # everyone waits a full (new) gap
+
+    def __repr__(self):
+        return f"{self.rate:.2f} hits/s ({self.accepted} accepted, {self.slow_downs} slow downs)"
@@ -0,0 +1,92 @@
+"""Retry policies of get_content per kind of request, and a circuit breaker per server.
+
+A POST that may have reached the game (buy, donate, bid...) is never sent again: it's retried only when the game
+surely didn't handle it (403 / captcha redirect, or the connection wasn't even made).
+Other 4xx answers are final for every kind of request.
+Hits are the exception: a hit that is sent twice is just one more hit.
+While a server is down, its breaker makes every request fail at once (CircuitOpen) instead of waiting for retries;
+after `cooldown` seconds one request is let through to check it."""
+from random import uniform
+import time
+
+# outcomes that prove that the request wasn't handled by the game
+NOT_HANDLED = ("blocked", "not_sent")
+
+
+class CircuitOpen(OSError):
+    pass
+
+
+class RetryPolicy:
+    __slots__ = ("attempts", "base", "cap", "retry_on")
+
+    def __init__(self, attempts, base=1.0, cap=16.0, retry_on=None):
+        self.attempts = attempts
+        self.base = base  # seconds before the first retry (at most)
+        self.cap = cap
+        self.retry_on = retry_on  # outcomes to retry (None = everything except success)
+
+    def should_retry(self, outcome) -> bool:
+        if outcome == 200 or (isinstance(outcome, int) and 400 <= outcome < 500):
+            return False
+        return self.retry_on is None or outcome in self.retry_on
+
+    def delay(self, attempt) -> float:
+        """Exponential backoff with full jitter (`attempt` >= 1)"""
+        return uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+
+POLICIES = {"get": RetryPolicy(5, base=1, cap=16),
+            "api": RetryPolicy(5, base=0.5, cap=8),
+            "fight": RetryPolicy(3, base=0.5, cap=4),
+            "post": RetryPolicy(3, base=1, cap=8, retry_on=NOT_HANDLED)}
+
+
+def policy_of(method, return_type) -> RetryPolicy:
+    if method == "post":
+        return POLICIES["fight" if return_type == "fight" else "post"]
+    return POLICIES["api" if return_type == "json" else "get"]
+
+
+class CircuitBreaker:
+    """Opens after `threshold` failures in a row (connection errors, timeouts, 5xx)"""
+
+    def __init__(self, threshold=5, cooldown=15.0, max_cooldown=300.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.min_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def check(self, server):
+        """Raises CircuitOpen if requests to `server` should fail fast"""
+        if self.opened_at is None:
+            return
+        if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+            raise CircuitOpen(f"{server} seems to be down (trying again in "
+                              f"{max(0, round(self.opened_at + self.cooldown - time.monotonic()))}s)")
+        self.probing = True  # this request checks whether the server is back
+
+    def release(self):
+        """After a request that didn't complete (e.g. cancelled): lets another one probe"""
+        self.probing = False
+
+    def record(self, outcome):
+        if outcome in ("error", "not_sent") or (isinstance(outcome, int) and outcome >= 500):
+            self.failures += 1
+            if self.opened_at is not None:  # the check failed
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self.opened_at = time.monotonic()
+            elif self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+        elif outcome not in ("blocked", "bad_json", "bad_html"):
+            self.failures = 0
+            self.opened_at = None
+            self.cooldown = self.min_cooldown
+        self.probing = False
@@ -0,0 +1,165 @@
+"""One timer heap for the commands that wait (auto_work, auto_motivate, attack / bid with a delay).
+
+Every job is saved at the "jobs" collection of the "auto" database, so it survives restarts, and runs a bot command
+in the channel (and as the account) that scheduled it, without fetching the original message.
+`daily` jobs run `daily` times a day (Europe/Berlin), at a random time in each part of the day; after a downtime
+they run once and continue from now (the missed runs are skipped).
+A one-off job that is more than MISSED_AFTER seconds late (e.g. the bot was down) doesn't run, and the channel is told."""
+from asyncio import Event, Queue, TimeoutError, wait_for
+from datetime import datetime, time as dt_time, timedelta
+import heapq
+from random import uniform
+import time
+from traceback import print_exc
+from uuid import uuid4
+
+from discord.ext.commands import Context
+from discord.ext.commands.view import StringView
+from pytz import timezone
+
+import accounts
+import utils
+
+TZ = timezone('Europe/Berlin')
+MISSED_AFTER = 10 * 60
+
+
+def next_daily(times_per_day, after, margin=600, skip_current=False) -> float:
+    """A random time (epoch) after `after`, in its part of the day (or in the next part, if it's too late or
+    `skip_current`). Nothing runs at the last `margin` seconds of a part.
+    The parts split the local day, so they are longer / shorter on the days the clocks change."""
+    day = datetime.fromtimestamp(after, TZ).date()
+    midnight = TZ.localize(datetime.combine(day, dt_time(0))).timestamp()
+    part = (TZ.localize(datetime.combine(day + timedelta(days=1), dt_time(0))).timestamp() - midnight) / times_per_day
+    margin = min(margin, part / 2)
+    end = midnight + ((after - midnight) // part + 1) * part
+    if skip_current or end - margin <= after:
+        return next_daily(times_per_day, end + 1, margin)
+    return uniform(after, end - margin)
+
+
+class Scheduler:
+    def __init__(self, bot, workers=4):
+        self.bot = bot
+        self.workers = workers
+        self.jobs = {}  # id: job
+        self._heap = []  # (when, id). Cancelled / rescheduled entries are skipped when they come up
+        self._queue = Queue()
+        self._changed = Event()
+        self._tasks = []
+
+    async def start(self):
+        """Loads the saved jobs of this process' accounts (other processes may share the database)
+        and starts the timer and the workers"""
+        for account in accounts.all_accounts():
+            async for job in utils.find("auto", "jobs", filter={"account": account.nick}):
+                job_id = job.pop("_id")
+                self.jobs[job_id] = job
+                heapq.heappush(self._heap, (job["when"], job_id))
+        self._tasks = [self.bot.loop.create_task(self._timer())]
+        self._tasks += [self.bot.loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def add(self, ctx, command, *args, name=None, delay=0, daily=0, **kwargs) -> str:
+        """Runs `command` with the given arguments after `delay` seconds, or `daily` times a day.
+        `name` (the invoked command by default) is what `.jobs` shows and `.hold` cancels.
+        A daily job replaces the previous one with the same name."""
+        return await self.add_at(ctx.channel.name, ctx.channel.id, ctx.message.id, accounts.current().nick, command,
+                                 *args, name=name or str(ctx.command), delay=delay, daily=daily,
+                                 invoked_with=ctx.invoked_with if command == str(ctx.command) else command, **kwargs)
+
+    async def add_at(self, server, channel_id, message_id, account, command, *args, name=None, delay=0, daily=0,
+                     invoked_with=None, **kwargs) -> str:
+        """`add` without a context (`account` is the account's main nick)"""
+        name = name or command
+        if daily:
+            await self.cancel(server=server, account=account, name=name)
+        job = {"when": next_daily(daily, time.time()) if daily else time.time() + delay,
+               "server": server, "channel_id": str(channel_id), "message_id": str(message_id),
+               "account": account, "name": name, "command": command, "invoked_with": invoked_with or command,
+               "args": list(args), "kwargs": kwargs, "daily": daily}
+        job_id = uuid4().hex[:8]
+        await self._save(job_id, job)
+        return job_id
+
+    def find(self, server=None, account=None, name=None) -> list:
+        """[(id, job)] by time"""
+        return sorted(((job_id, job) for job_id, job in self.jobs.items() if server in (None, job["server"]) and
+                       account in (None, job["account"]) and name in (None, job["name"])), key=lambda x: x[1]["when"])
+
+    async def cancel(self, job_id=None, **match) -> int:
+        """Cancels the given job, or all the jobs that match (see `find`). Returns how many were cancelled"""
+        cancelled = 0
+        for ID in [job_id] if job_id else [ID for ID, _ in self.find(**match)]:
+            if self.jobs.pop(ID, None) is not None:
+                await utils.delete_one("auto", "jobs", ID)
+                cancelled += 1
+        return cancelled
+
+    def context(self, job) -> Context:
+        """A context for the job's channel and message, like the one the command was scheduled with"""
+        channel = self.bot.get_channel(int(job["channel_id"]))
+        message = channel.get_partial_message(int(job["message_id"]))
+        return Context(prefix=".", bot=self.bot, message=message, view=StringView(""),
+                       command=self.bot.get_command(job["command"]), invoked_with=job["invoked_with"])
+
+    async def _save(self, job_id, job):
+        self.jobs[job_id] = job
+        await utils.replace_one("auto", "jobs", job_id, job)
+        heapq.heappush(self._heap, (job["when"], job_id))
+        self._changed.set()
+
+    async def _timer(self):
+        while True:
+            self._changed.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                when, job_id = heapq.heappop(self._heap)
+                job = self.jobs.get(job_id)
+                if job is not None and job["when"] == when:
+                    self._queue.put_nowait(job_id)
+            try:
+                await wait_for(self._changed.wait(), self._heap[0][0] - now if self._heap else None)
+            except TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or self._account(job) is None:  # not ours: leave it to its own process
+                continue
+            try:
+                if not job["daily"] and time.time() - job["when"] > MISSED_AFTER:
+                    await self._missed(job)
+                else:
+                    await self._run(job)
+            except Exception:
+                print_exc()
+            if job_id not in self.jobs:  # cancelled meanwhile
+                continue
+            if job["daily"]:
+                job["when"] = next_daily(job["daily"], max(job["when"], time.time()), skip_current=True)
+                await self._save(job_id, job)
+            else:
+                await self.cancel(job_id)
+
+    async def _missed(self, job):
+        channel = self.bot.get_channel(int(job["channel_id"]))
+        if channel is not None:
+            when = datetime.fromtimestamp(job["when"], TZ).strftime("%Y-%m-%d %H:%M")
+            await channel.send(f"**{job['account']}** I missed `{job['name']}` (it was scheduled for {when}, "
+                               f"Europe/Berlin time), so I didn't run it.")
+
+    @staticmethod
+    def _account(job):
+        return next((account for account in accounts.all_accounts() if account.nick == job["account"]), None)
+
+    async def _run(self, job):
+        if self.bot.get_channel(int(job["channel_id"])) is None:
+            return
+        accounts.use(self._account(job))
+        ctx = self.context(job)
+        try:
+            await ctx.invoke(ctx.command, *job["args"], **job["kwargs"])
+        except Exception as error:
+            self.bot.dispatch("command_error", ctx, error)
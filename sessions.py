@@ -0,0 +1,49 @@
+from asyncio import Lock
+
+from aiohttp import ClientSession, CookieJar, TCPConnector
+
+
+class SessionManager:
+    """Keeps a separate aiohttp session (cookie jar) for every account at every e-sim server,
+    so logging in again at one server doesn't drop the keep-alive connections of the others.
+    The accounts of the same server share its connection pool."""
+
+    def __init__(self, headers, limit_per_host=10, dns_ttl=600, keepalive_timeout=60, unsafe_cookies=False):
+        self.headers = headers
+        self.unsafe_cookies = unsafe_cookies  # cookies of IP addresses (local test servers)
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._connectors = {}
+        self._sessions = {}
+        self._login_locks = {}
+        self.logins = {}  # (server, account): number of logins, so waiting coroutines won't log in again
+
+    def get(self, server, account="") -> ClientSession:
+        session = self._sessions.get((server, account))
+        if session is None or session.closed:
+            connector = self._connectors.get(server)
+            if connector is None or connector.closed:
+                connector = TCPConnector(limit_per_host=self.limit_per_host, ttl_dns_cache=self.dns_ttl,
+                                         keepalive_timeout=self.keepalive_timeout)
+                self._connectors[server] = connector
+            session = ClientSession(connector=connector, connector_owner=False,
+                                    cookie_jar=CookieJar(unsafe=self.unsafe_cookies), headers=self.headers)
+            self._sessions[(server, account)] = session
+        return session
+
+    def login_lock(self, server, account="") -> Lock:
+        """Makes sure that only one coroutine logs in to a given account at a time"""
+        if (server, account) not in self._login_locks:
+            self._login_locks[(server, account)] = Lock()
+        return self._login_locks[(server, account)]
+
+    def clear_cookies(self, server, account=""):
+        if (server, account) in self._sessions:
+            self._sessions[(server, account)].cookie_jar.clear()
+
+    async def close(self, server=None):
+        for key in [key for key in self._sessions if server in (None, key[0])]:
+            await self._sessions.pop(key).close()
+        for key in [key for key in self._connectors if server in (None, key)]:
+            await self._connectors.pop(key).close()
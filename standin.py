@@ -0,0 +1,370 @@
+"""A local stand-in for the e-sim servers, for load and scaling tests (never point it at real accounts).
+
+Run it with `python standin.py --port 8080` and add `"game_url": "http://127.0.0.1:8080",` at config.json:
+every `https://<server>.e-sim.org/<page>` request of the bot goes to `http://127.0.0.1:8080/<server>/<page>` instead.
+
+It emulates the pages and apis that the bot uses the most (battles, fights, scores, the maps apis, storage, markets,
+merges and login), with rounds that really end, health and limits, "Slow down a bit!", random 403s and google
+redirects, and configurable latency. Any nick can log in with any password."""
+from argparse import ArgumentParser
+from asyncio import sleep
+from itertools import count
+import json
+import random
+import time
+
+from aiohttp import web
+
+PRODUCTS = ("Weapon", "Food", "Gift", "Ticket")
+
+
+class Citizen:
+    def __init__(self, citizen_id, nick, country_id):
+        self.id = citizen_id
+        self.nick = nick
+        self.country_id = country_id
+        self.region_id = (country_id - 1) * 6 + 1
+        self.health = 100.0
+        self.food_limit = self.gift_limit = 15
+        self.products = {f"Q5 {product}": 1000 for product in PRODUCTS}
+        self.gold = 1000.0
+        self.money = {}
+        self.equipment = {}
+        self.last_hit = 0.0
+
+
+class Battle:
+    def __init__(self, battle_id, region_id, attacker_id, defender_id, round_seconds):
+        self.id = battle_id
+        self.region_id = region_id
+        self.attacker_id = attacker_id
+        self.defender_id = defender_id
+        self.round_seconds = round_seconds
+        self.round = 1
+        self.round_id = battle_id * 100 + 1
+        self.round_end = time.monotonic() + round_seconds
+        self.scores = {"attacker": 0, "defender": 0}
+        self.damage = {"attacker": 0, "defender": 0}
+        self.fights = []
+
+    @property
+    def is_over(self):
+        return 8 in self.scores.values()
+
+    def advance(self):
+        while not self.is_over and time.monotonic() >= self.round_end:
+            winner = "attacker" if self.damage["attacker"] > self.damage["defender"] else "defender"
+            self.scores[winner] += 1
+            self.round += 1
+            self.round_id += 1
+            self.round_end += self.round_seconds
+            self.damage = {"attacker": 0, "defender": 0}
+            self.fights = []
+
+    @property
+    def seconds_left(self):
+        return 0 if self.is_over else max(0, int(self.round_end - time.monotonic()))
+
+
+class World:
+    def __init__(self, countries=10, battles=5, round_seconds=120):
+        self.countries = [{"id": i, "name": f"Country{i}", "shortName": f"C{i}", "currencyName": f"C{i}",
+                           "capitalRegionId": (i - 1) * 6 + 1} for i in range(1, countries + 1)]
+        self.regions = []
+        for region_id in range(1, countries * 6 + 1):
+            neighbours = [r for r in (region_id - 1, region_id + 1, region_id - 6, region_id + 6)
+                          if 1 <= r <= countries * 6]
+            self.regions.append({"id": region_id, "homeCountry": (region_id - 1) // 6 + 1, "neighbours": neighbours,
+                                 "capital": region_id % 6 == 1, "name": f"Region{region_id}"})
+        self.occupants = {region["id"]: region["homeCountry"] for region in self.regions}
+        self.round_seconds = round_seconds
+        self.ids = count(1)
+        self.battles = {}
+        for _ in range(battles):
+            self.new_battle()
+        self.citizens = {}
+        self.offers = {}  # currency id: {offer id: [amount, price]}
+        self.offer_ids = count(1)
+        self.item_ids = count(1)
+
+    def new_battle(self):
+        region = random.choice(self.regions)
+        attacker = random.choice([r for r in region["neighbours"]])
+        battle = Battle(next(self.ids), region["id"], self.occupants[attacker], self.occupants[region["id"]],
+                        self.round_seconds)
+        self.battles[battle.id] = battle
+        return battle
+
+    def battle(self, battle_id):
+        battle = self.battles.get(int(battle_id))
+        if battle is not None:
+            battle.advance()
+            if battle.is_over and len([b for b in self.battles.values() if not b.is_over]) < len(self.battles) // 2:
+                self.new_battle()
+        return battle
+
+    def citizen(self, nick):
+        if nick.lower() not in self.citizens:
+            citizen = Citizen(len(self.citizens) + 1, nick, random.randint(1, len(self.countries)))
+            citizen.money = {country["currencyName"]: 100.0 for country in self.countries[:3]}
+            for _ in range(10):
+                citizen.equipment[next(self.item_ids)] = random.randint(1, 3)
+            self.citizens[nick.lower()] = citizen
+        return self.citizens[nick.lower()]
+
+    def market(self, currency_id):
+        if currency_id not in self.offers:
+            self.offers[currency_id] = {next(self.offer_ids): [round(random.uniform(1, 50), 2),
+                                                               round(random.uniform(0.01, 0.05), 4)]
+                                        for _ in range(20)}
+        return self.offers[currency_id]
+
+
+def _page(body, title=""):
+    return f"<html><head><title>{title}</title></head><body><div id='esim-layout'>{body}</div></body></html>"
+
+
+class StandIn:
+    def __init__(self, latency=(0.0, 0.0), forbidden_rate=0.0, google_rate=0.0, hit_interval=0.5, **world):
+        self.latency = latency
+        self.forbidden_rate = forbidden_rate
+        self.google_rate = google_rate
+        self.hit_interval = hit_interval
+        self.world = World(**world)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_route("*", "/google.com/", lambda _: web.Response(text="google"))
+        app.router.add_route("*", "/{server}/", self.index)
+        app.router.add_route("*", "/{server}/{page}", self.dispatch)
+        return app
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        if self.latency[1]:
+            await sleep(random.uniform(*self.latency))
+        if request.path.startswith("/google.com") or request.path.endswith(("/", "login.html")):
+            return await handler(request)  # the bot doesn't retry logins
+        if random.random() < self.forbidden_rate:
+            return web.Response(status=403, text="Forbidden")
+        if random.random() < self.google_rate:
+            raise web.HTTPFound("/google.com/")
+        return await handler(request)
+
+    def me(self, request):
+        nick = request.cookies.get("esim_nick")
+        if not nick:
+            raise web.HTTPFound(f"/{request.match_info['server']}/index.html?notLoggedIn=true")
+        return self.world.citizen(nick)
+
+    async def index(self, request):
+        return web.Response(text=_page("<form id='command' action='login.html'></form>"), content_type="text/html")
+
+    async def dispatch(self, request):
+        page = request.match_info["page"]
+        handler = getattr(self, "page_" + page.replace(".html", ""), None)
+        if handler is None:
+            return web.Response(text=_page(f"<div>{page}</div>"), content_type="text/html")
+        data = dict(await request.post()) if request.method == "POST" else {}
+        result = handler(request, data)
+        if isinstance(result, web.StreamResponse):
+            return result
+        if isinstance(result, (list, dict)):
+            return web.Response(text=json.dumps(result), content_type="application/json")
+        return web.Response(text=result, content_type="text/html")
+
+    def page_index(self, request, data):
+        return _page("<div>index</div>")
+
+    def page_login(self, request, data):
+        response = web.HTTPFound(f"/{request.match_info['server']}/index.html?act=login")
+        response.set_cookie("esim_nick", data.get("login", ""))
+        return response
+
+    # apis
+    def page_apiCountries(self, request, data):
+        return self.world.countries
+
+    def page_apiRegions(self, request, data):
+        return self.world.regions
+
+    def page_apiMap(self, request, data):
+        battles = {b.region_id: b.id for b in self.world.battles.values() if not b.is_over}
+        return [{"regionId": region_id, "occupantId": occupant, **({"battleId": battles[region_id]} if
+                                                                    region_id in battles else {})}
+                for region_id, occupant in self.world.occupants.items()]
+
+    def page_apiCitizenByName(self, request, data):
+        citizen = self.world.citizen(request.query["name"])
+        return {"id": citizen.id, "login": citizen.nick, "citizenshipId": citizen.country_id,
+                "citizenship": self.world.countries[citizen.country_id - 1]["name"],
+                "currentLocationRegionId": citizen.region_id, "level": 10, "damageToday": 0}
+
+    def page_apiBattles(self, request, data):
+        battle = self.world.battle(request.query["battleId"])
+        if battle is None:
+            return {"error": "No battle with this id"}
+        left = battle.seconds_left
+        return [{"id": battle.id, "regionId": battle.region_id, "attackerId": battle.attacker_id,
+                 "defenderId": battle.defender_id, "attackerScore": battle.scores["attacker"],
+                 "defenderScore": battle.scores["defender"], "currentRound": battle.round, "frozen": False,
+                 "type": "ATTACK", "hoursRemaining": left // 3600, "minutesRemaining": left % 3600 // 60,
+                 "secondsRemaining": left % 60}]
+
+    def page_apiFights(self, request, data):
+        battle = self.world.battle(request.query["battleId"])
+        return battle.fights if battle is not None and battle.round == int(request.query["roundId"]) else []
+
+    def page_battleScore(self, request, data):
+        battle = next((b for b in self.world.battles.values() if b.round_id == int(request.query["id"])), None)
+        if battle is None:
+            return {"error": "No round with this id"}
+        battle.advance()
+        return {"attackerScore": f"{battle.damage['attacker']:,}", "defenderScore": f"{battle.damage['defender']:,}",
+                "remainingTimeInSeconds": battle.seconds_left, "spectatorsOnline": random.randint(0, 3),
+                "attackersOnline": random.randint(0, 3), "defendersOnline": random.randint(0, 3)}
+
+    # battles
+    def page_battle(self, request, data):
+        me = self.me(request)
+        battle = self.world.battle(request.query["id"])
+        weapons = "".join(f"<div id='Q{q}WeaponStock'>{me.products.get(f'Q{q} Weapon', 0)}</div>" for q in range(1, 6))
+        tops = "".join(f"<div id='top{side}1'><div><div><a>{side}Top</a></div><div>{battle.damage[side.lower()]:,}"
+                       f"</div></div></div>" for side in ("Attacker", "Defender"))
+        return _page(f"""<div id='actualHealth'>{me.health}</div><div id='foodLimit2'>{me.food_limit}</div>
+            <div id='giftLimit2'>{me.gift_limit}</div><div id='sfoodQ5'>{me.products['Q5 Food']}</div>
+            <div id='sgiftQ5'>{me.products['Q5 Gift']}</div><input id='battleRoundId' value='{battle.round_id}'/>
+            <div id='attackerScore'>{battle.scores['attacker']}</div><div id='defenderScore'>{battle.scores['defender']}</div>
+            {weapons}{tops}<script>var a;</script><script>var b;</script>
+            <script>var fight = {{url: "fight.html", data: 'x=1&ip=127.0.0.1&token={me.id}'}};</script>""")
+
+    def page_fight(self, request, data):
+        me = self.me(request)
+        battle = next((b for b in self.world.battles.values() if str(b.round_id) == data.get("battleRoundId")), None)
+        if battle is not None:
+            battle.advance()
+        if battle is None or battle.is_over or str(battle.round_id) != data.get("battleRoundId"):
+            return _page("<div><div>Round is closed</div></div>")
+        now = time.monotonic()
+        if now - me.last_hit < self.hit_interval:
+            return _page("<div><div>Slow down a bit!</div></div>")
+        hits = 5 if data.get("value") == "Berserk" else 1
+        if me.health < hits * 10:
+            return _page("<div><div>No health left</div></div>")
+        me.last_hit = now
+        weapon = f"Q{data.get('weaponQuality', 0)} Weapon"
+        if me.products.get(weapon, 0) > 0:
+            me.products[weapon] -= min(hits, me.products[weapon])
+        me.health -= hits * 10
+        damage = hits * random.randint(5000, 15000)
+        side = data.get("side", "attacker")
+        battle.damage[side] = battle.damage.get(side, 0) + damage
+        battle.fights.append({"citizenId": me.id, "damage": damage, "defenderSide": side == "defender",
+                              "weapon": data.get("weaponQuality", 0), "berserk": hits == 5})
+        return _page(f"<div id='healthUpdate'>{me.health} hp</div><div id='DamageDone'>{damage:,}</div>")
+
+    def _restore(self, request, data, product, limit):
+        me = self.me(request)
+        if getattr(me, limit) > 0 and me.products.get(f"Q5 {product}", 0) > 0:
+            setattr(me, limit, getattr(me, limit) - 1)
+            me.products[f"Q5 {product}"] -= 1
+            me.health = min(100.0, me.health + 50)
+        return _page(f"<div id='actualHealth'>{me.health}</div>")
+
+    def page_eat(self, request, data):
+        return self._restore(request, data, "Food", "food_limit")
+
+    def page_gift(self, request, data):
+        return self._restore(request, data, "Gift", "gift_limit")
+
+    # storage and markets
+    def page_home(self, request, data):
+        me = self.me(request)
+        return _page(f"""<a id='userName' href='profile.html?id={me.id}'>{me.nick}</a>
+            <div id='userMenu'><div><div></div><div></div><div></div><div><div><b>{me.gold}</b></div></div></div></div>
+            <div id='foodLimit2'>{me.food_limit}</div><div id='giftLimit2'>{me.gift_limit}</div>
+            <div id='foodQ5'>{me.products['Q5 Food']}</div><div id='giftQ5'>{me.products['Q5 Gift']}</div>
+            <a id='taskButtonWork' href='work.html'>work</a>""")
+
+    def page_storage(self, request, data):
+        me = self.me(request)
+        storage_type = request.query.get("storageType", "EQUIPMENT" if "actionStatus" in request.query else "PRODUCT")
+        if storage_type == "EQUIPMENT":
+            body = "".join(f"<div id='cell{ID}'><a>#{ID}</a><b>Q{Q} Helmet</b><br/>x<br/>y<br/>Increased damage by {Q}%"
+                           f"</div>" for ID, Q in me.equipment.items())
+        elif storage_type == "MONEY":
+            body = "<div id='storageConteiner'><div><div><div><div>Gold</div>" + "".join(
+                f"<div><b>{amount}</b> {currency}</div>" for currency, amount in me.money.items()) + "</div></div></div></div>"
+        else:
+            body = "".join(f"<div class='storage'><div>{amount}</div><div>"
+                           f"<img src='//cdn.e-sim.org//img/productIcons/{name.split()[1]}.png'/>"
+                           f"<img src='//cdn.e-sim.org//img/productIcons/{name.split()[0].lower()}.png'/></div></div>"
+                           for name, amount in me.products.items())
+        return _page(f"<div class='sidebar-money'><b>{me.gold}</b></div>{body}")
+
+    def page_equipmentAction(self, request, data):
+        me = self.me(request)
+        server = request.match_info["server"]
+        ids = [int(v) for k, v in data.items() if k.startswith("itemId")]
+        qualities = {me.equipment.get(ID) for ID in ids}
+        if data.get("action") != "MERGE" or len(ids) != 3 or len(qualities) != 1 or None in qualities:
+            raise web.HTTPFound(f"/{server}/storage.html?actionStatus=CONVERT_ITEM_FAILED")
+        for ID in ids:
+            del me.equipment[ID]
+        me.equipment[next(self.world.item_ids)] = qualities.pop() + 1
+        raise web.HTTPFound(f"/{server}/storage.html?actionStatus=CONVERT_ITEM_OK")
+
+    def page_monetaryMarket(self, request, data):
+        me = self.me(request)
+        server = request.match_info["server"]
+        currency_id = int(request.query.get("buyerCurrencyId", 1))
+        offers = self.world.market(currency_id)
+        if data.get("action") == "buy":
+            offer = offers.get(int(data["id"]))
+            amount = float(data.get("ammount", 0))
+            if offer is None or amount > offer[0] or amount * offer[1] > me.gold:
+                raise web.HTTPFound(f"/{server}/monetaryMarket.html?message=MM_POST_FAILED")
+            offer[0] = round(offer[0] - amount, 2)
+            if offer[0] <= 0:
+                del offers[int(data["id"])]
+            me.gold -= amount * offer[1]
+            currency = self.world.countries[currency_id - 1]["currencyName"]
+            me.money[currency] = me.money.get(currency, 0) + amount
+            raise web.HTTPFound(f"/{server}/monetaryMarket.html?buyerCurrencyId={currency_id}&message=MM_POST_OK_BUY")
+        rows = "".join(f"<tr><td><a>NPC</a></td><td><b>{amount}</b></td><td><b>{price}</b></td><td><form>"
+                       f"<input name='action' value='buy'/><input name='id' value='{ID}'/></form></td></tr>"
+                       for ID, (amount, price) in sorted(offers.items(), key=lambda x: x[1][1]))
+        return _page(f"<table><tr><th>Seller</th><th>Amount</th><th>Ratio</th><th>Buy</th></tr>{rows}</table>")
+
+    def page_productMarket(self, request, data):
+        me = self.me(request)
+        server = request.match_info["server"]
+        if data.get("action") == "buy":
+            quantity = int(data.get("quantity", 0))
+            product = f"Q5 {str(data.get('id', 'Q5 Food')).split('-')[-1].title()}"
+            me.products[product] = me.products.get(product, 0) + quantity
+            raise web.HTTPFound(f"/{server}/productMarket.html?status=POST_PRODUCT_BUY_OK")
+        resource = request.query.get("resource", "FOOD")
+        return _page(f"""<form id='command' action='productMarket.html'><input value='5-{resource}'/></form>
+            <table><tr><th>h</th></tr><tr><td>NPC</td><td>{resource}</td><td>1000</td>
+            <td><b>x</b> 0.05 <span>C{me.country_id}</span></td></tr></table>""")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.0, 0.0), metavar=("MIN", "MAX"))
+    parser.add_argument("--forbidden-rate", type=float, default=0.0, help="chance of a 403")
+    parser.add_argument("--google-rate", type=float, default=0.0, help="chance of a google redirect")
+    parser.add_argument("--hit-interval", type=float, default=0.5, help='"Slow down a bit!" below this (seconds)')
+    parser.add_argument("--battles", type=int, default=5)
+    parser.add_argument("--round-seconds", type=int, default=120)
+    args = parser.parse_args()
+    standin = StandIn(tuple(args.latency), args.forbidden_rate, args.google_rate, args.hit_interval,
+                      battles=args.battles, round_seconds=args.round_seconds)
+    web.run_app(standin.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from battle_state import BattlePoller
+
+API = {"hoursRemaining": 0, "minutesRemaining": 0, "secondsRemaining": 20, "attackerScore": 0, "defenderScore": 0,
+       "currentRound": 1}
+
+
+class Bot:
+    def __init__(self, loop, answers):
+        self.loop = loop
+        self.answers = answers
+        self.requests = []
+
+    async def get_content(self, link, return_type=""):
+        self.requests.append(link)
+        answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def poller(answers):
+    bot = Bot(asyncio.get_running_loop(), answers)
+    return bot, BattlePoller(bot, fast_interval=0.01, max_interval=0.01, idle_timeout=0.1)
+
+
+def test_a_failed_poll_doesnt_wake_the_waiters(monkeypatch):
+    monkeypatch.setattr("battle_state.sleep", lambda _: asyncio.sleep(0))
+
+    async def main():
+        _, battles = poller([OSError(), API])
+        return await battles.get("alpha", 1).round_end(30)
+
+    assert asyncio.run(main())["currentRound"] == 1
+
+
+def test_the_last_error_is_raised(monkeypatch):
+    monkeypatch.setattr("battle_state.sleep", lambda _: asyncio.sleep(0))
+
+    async def main():
+        _, battles = poller([OSError("down")])
+        await battles.get("alpha", 1).current()
+
+    with pytest.raises(OSError, match="down"):
+        asyncio.run(main())
+
+
+def test_get_doesnt_poll_and_scores_are_shared():
+    async def main():
+        bot, battles = poller([{"spectatorsOnline": 1}])
+        state = battles.get("alpha", 1)
+        citizen = {"id": 5, "citizenshipId": 2}
+        scores = await asyncio.gather(state.get_score(10, citizen), state.get_score(10, citizen))
+        return bot.requests, scores
+
+    requests, scores = asyncio.run(main())
+    assert scores[0] is scores[1]
+    assert requests == ["https://alpha.e-sim.org/battleScore.html?id=10&at=5&ci=2&premium=1"]
@@ -0,0 +1,25 @@
+from cache import STORAGE_TYPES, TTLCache, storage_writes
+
+
+def test_storage_writes():
+    assert storage_writes("food.html") == ("PRODUCT", )
+    assert storage_writes("ticket.html") == ("PRODUCT", )
+    assert storage_writes("donateMoney.html") == STORAGE_TYPES
+    assert storage_writes("vote.html") == ()
+
+
+def test_every_hit_changes_the_products():
+    assert storage_writes("fightShooting.html", "fight") == ("PRODUCT", )
+    assert set(storage_writes("work.html", "fight")) == {"MONEY", "PRODUCT"}
+
+
+def test_ttl_cache():
+    cache = TTLCache(max_size=2)
+    cache.set(("alpha", "a", 1), 1, 60)
+    cache.set(("alpha", "b", 2), 2, -1)
+    assert cache.get(("alpha", "b", 2)) is None  # expired
+    cache.set(("beta", "a", 3), 3, 60)
+    cache.set(("alpha", "a", 4), 4, 60)
+    assert len(cache) == 2 and cache.get(("alpha", "a", 1)) is None  # the oldest was evicted
+    cache.invalidate("alpha", "a")
+    assert len(cache) == 1
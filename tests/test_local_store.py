@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from local_store import LocalStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the old json files are looked up at the working directory
+    return LocalStore(str(tmp_path / "database.db"))
+
+
+def test_paging(store):
+    for i in range(7):
+        store.replace_one("alpha", "info", f"nick{i}", {"level": 7 - i})
+    pages = [store.find("alpha", "info", limit=3, offset=offset) for offset in (0, 3, 6)]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [doc["_id"] for page in pages for doc in page] == [f"nick{i}" for i in range(7)]
+    assert [doc["level"] for doc in store.find("alpha", "info", sort="level", limit=3)] == [1, 2, 3]
+
+
+def test_filter_and_projection(store):
+    store.replace_one("alpha", "info", "a", {"level": 1, "country": "x"})
+    store.replace_one("alpha", "info", "b", {"level": 2, "country": "y"})
+    store.replace_one("beta", "info", "c", {"level": 1, "country": "x"})
+    assert store.find("alpha", "info", {"country": "x"}, ["level"]) == [{"level": 1, "_id": "a"}]
+    assert store.find("alpha", "info", {"_id": "b"})[0]["country"] == "y"
+
+
+def test_replace_and_delete(store):
+    store.replace_one("alpha", "info", "a", {"level": 1})
+    store.replace_one("alpha", "info", "a", {"level": 2})
+    assert store.find_one("alpha", "info", "a") == {"level": 2}
+    store.delete_one("alpha", "info", "a")
+    assert store.find_one("alpha", "info", "a") == {}
+
+
+def test_imports_old_json_once(store, tmp_path):
+    (tmp_path / "alpha_info.json").write_text(json.dumps({"a": {"level": 1}}))
+    assert store.find_one("alpha", "info", "a") == {"level": 1}
+    store.delete_one("alpha", "info", "a")
+    assert LocalStore(str(tmp_path / "database.db")).find_one("alpha", "info", "a") == {}
@@ -0,0 +1,20 @@
+from orderbook import OrderBook
+
+
+def book():
+    return OrderBook(["b", "a", "c"], [10, 5, 100], [0.02, 0.01, 0.03])
+
+
+def test_cheapest_first():
+    assert book().plan(12) == [("a", 5, 0.01, 0.05), ("b", 7, 0.02, 0.19)]
+
+
+def test_max_price():
+    assert book().plan(1000, max_price=0.02) == [("a", 5, 0.01, 0.05), ("b", 10, 0.02, 0.25)]
+
+
+def test_fill():
+    orders = book()
+    orders.fill("a", 5)
+    assert len(orders) == 2 and orders.best_price == 0.02
+    assert orders.plan(1)[0][0] == "b"
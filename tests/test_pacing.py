@@ -0,0 +1,41 @@
+import time
+
+from pacing import Pacer
+
+
+def test_slow_start_till_the_first_slow_down():
+    pacer = Pacer(rate=1.0, jitter=0)
+    pacer.on_accepted(0.1)
+    assert pacer.rate == 1.1
+    pacer.on_slow_down()
+    assert pacer.rate == 0.55 and not pacer.slow_start
+    pacer.on_accepted(0.1)
+    assert round(pacer.rate, 2) == 0.6
+
+
+def test_rate_limits():
+    pacer = Pacer(rate=1.0, min_rate=0.5, max_rate=2.0)
+    for _ in range(3):
+        pacer.on_slow_down()
+    assert pacer.rate == 0.5
+    pacer = Pacer(rate=1.0, min_rate=0.5, max_rate=2.0)
+    for _ in range(50):
+        pacer.on_accepted(0.1)
+    assert pacer.rate == 2.0
+
+
+def test_hits_sent_before_a_decrease_dont_decrease_again():
+    pacer = Pacer(rate=4.0)
+    sent_at = time.monotonic()  # both hits were in flight
+    pacer.on_slow_down(sent_at)
+    pacer.on_slow_down(sent_at)
+    assert pacer.rate == 2.0 and pacer.slow_downs == 2
+
+
+def test_queueing_lowers_the_rate():
+    pacer = Pacer(rate=2.0)
+    pacer.on_accepted(0.1)
+    rate = pacer.rate
+    for _ in range(10):
+        pacer.on_accepted(1.0)
+    assert pacer.rate < rate
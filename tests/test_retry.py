@@ -0,0 +1,93 @@
+import pytest
+
+from retry import POLICIES, CircuitBreaker, CircuitOpen, policy_of
+
+
+@pytest.mark.parametrize("outcome, retried", [("blocked", True), ("not_sent", True), ("error", False),
+                                              (502, False), ("bad_html", False), ("bad_json", False), (200, False)])
+def test_post_is_retried_only_when_the_game_did_not_handle_it(outcome, retried):
+    assert policy_of("post", "html").should_retry(outcome) is retried
+
+
+@pytest.mark.parametrize("outcome, retried", [("error", True), ("not_sent", True), (502, True), ("blocked", True),
+                                              (404, False), (400, False), (200, False)])
+def test_get_retries(outcome, retried):
+    assert policy_of("get", "html").should_retry(outcome) is retried
+    assert policy_of("get", "json").should_retry(outcome) is retried
+
+
+def test_hits_may_be_sent_twice():
+    policy = policy_of("post", "fight")
+    assert policy is POLICIES["fight"]
+    assert policy.should_retry("error") and policy.should_retry(502)
+    assert not policy.should_retry(404)
+
+
+def test_delay_is_capped():
+    policy = POLICIES["get"]
+    for attempt in range(1, 10):
+        assert 0 <= policy.delay(attempt) <= min(policy.cap, policy.base * 2 ** (attempt - 1))
+
+
+def opened(breaker):
+    for _ in range(breaker.threshold):
+        breaker.check("alpha")
+        breaker.record("error")
+    return breaker
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3)
+    for _ in range(2):
+        breaker.record(503)
+    assert not breaker.is_open
+    breaker.record("not_sent")
+    assert breaker.is_open
+    with pytest.raises(CircuitOpen):
+        breaker.check("alpha")
+
+
+def test_neutral_outcomes_dont_reset_the_failures():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.record("error")
+    for outcome in ("blocked", "bad_json", "bad_html"):
+        breaker.record(outcome)
+    breaker.record("error")
+    assert breaker.is_open
+
+
+def test_success_resets_the_failures():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.record("error")
+    breaker.record(200)
+    breaker.record("error")
+    assert not breaker.is_open
+
+
+def test_one_probe_after_the_cooldown():
+    breaker = opened(CircuitBreaker(threshold=2, cooldown=10))
+    breaker.opened_at -= 10
+    breaker.check("alpha")  # the probe
+    with pytest.raises(CircuitOpen):
+        breaker.check("alpha")
+    breaker.record(200)
+    assert not breaker.is_open
+    breaker.check("alpha")
+
+
+def test_failed_probe_doubles_the_cooldown():
+    breaker = opened(CircuitBreaker(threshold=2, cooldown=10, max_cooldown=15))
+    breaker.opened_at -= 10
+    breaker.check("alpha")
+    breaker.record("error")
+    assert breaker.is_open and breaker.cooldown == 15
+    with pytest.raises(CircuitOpen):
+        breaker.check("alpha")
+
+
+def test_cancelled_probe_lets_another_one_through():
+    breaker = opened(CircuitBreaker(threshold=2, cooldown=10))
+    breaker.opened_at -= 10
+    breaker.check("alpha")
+    breaker.release()
+    breaker.check("alpha")
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import scheduler
+from scheduler import TZ, next_daily
+
+
+def epoch(*args) -> float:
+    return TZ.localize(datetime(*args)).timestamp()
+
+
+def local(timestamp) -> datetime:
+    return datetime.fromtimestamp(timestamp, TZ).replace(tzinfo=None)
+
+
+@pytest.fixture
+def latest(monkeypatch):
+    """next_daily picks the latest time it may"""
+    monkeypatch.setattr(scheduler, "uniform", lambda a, b: b)
+
+
+@pytest.fixture
+def earliest(monkeypatch):
+    monkeypatch.setattr(scheduler, "uniform", lambda a, b: a)
+
+
+def test_in_the_current_part(latest):
+    assert local(next_daily(3, epoch(2026, 10, 18, 10, 0))) == datetime(2026, 10, 18, 15, 50)
+
+
+def test_skip_current(earliest):
+    assert local(next_daily(3, epoch(2026, 10, 18, 10, 0), skip_current=True)) == datetime(2026, 10, 18, 16, 0, 1)
+
+
+def test_too_late_for_today_moves_past_midnight(latest):
+    when = next_daily(3, epoch(2026, 10, 18, 23, 55))
+    assert local(when) == datetime(2026, 10, 19, 7, 50)
+
+
+@pytest.mark.parametrize("times_per_day", [1, 2, 3, 5])
+@pytest.mark.parametrize("day", [(2026, 3, 29), (2026, 10, 25)])
+def test_last_part_ends_at_local_midnight_on_dst_days(latest, times_per_day, day):
+    assert local(next_daily(times_per_day, epoch(*day, 23, 0))) == datetime(*day, 23, 50)
+
+
+@pytest.mark.parametrize("day, hours", [((2026, 3, 29), 23), ((2026, 10, 25), 25)])
+def test_dst_days_are_split_evenly(earliest, day, hours):
+    after = epoch(*day, 0, 0)
+    starts = []  # of the 2nd, 3rd and 4th parts (+ 1 second)
+    for _ in range(3):
+        after = next_daily(4, after, skip_current=True)
+        starts.append(after - 1)
+    assert [round(b - a) for a, b in zip(starts, starts[1:])] == [hours * 900] * 2
+    assert local(starts[-1] + hours * 900) == datetime(day[0], day[1], day[2] + 1, 0, 0)
+
+
+def test_a_daily_job_never_runs_twice_in_a_part():
+    after = epoch(2026, 5, 1, 12, 0)  # no clock change in the next 200 runs (the parts are 8 hours long)
+    for _ in range(200):
+        when = next_daily(3, after, skip_current=True)
+        assert when > after
+        assert local(when).hour // 8 != local(after).hour // 8 or local(when).date() != local(after).date()
+        after = when
+
+
+class Account:
+    def __init__(self, nick):
+        self.nick = nick
+
+
+@pytest.fixture
+def shared_db(monkeypatch):
+    """The "auto/jobs" collection of a database that another process (account "other") uses too"""
+    jobs = {"mine": {"account": "me", "when": 0, "daily": 0, "channel_id": "1", "name": "attack"},
+            "theirs": {"account": "other", "when": 0, "daily": 0, "channel_id": "1", "name": "attack"}}
+
+    async def find(server, collection, filter=None, **_):
+        for job_id, job in list(jobs.items()):
+            if all(job.get(k) == v for k, v in (filter or {}).items()):
+                yield {**job, "_id": job_id}
+
+    async def delete_one(server, collection, job_id):
+        jobs.pop(job_id, None)
+
+    async def replace_one(server, collection, job_id, job):
+        jobs[job_id] = job
+
+    monkeypatch.setattr(scheduler.utils, "find", find)
+    monkeypatch.setattr(scheduler.utils, "delete_one", delete_one)
+    monkeypatch.setattr(scheduler.utils, "replace_one", replace_one)
+    monkeypatch.setattr(scheduler.accounts, "all_accounts", lambda: [Account("me")])
+    return jobs
+
+
+class Bot:
+    def __init__(self, loop):
+        self.loop = loop
+
+    def get_channel(self, _):
+        return None
+
+
+def test_jobs_of_other_processes_are_left_alone(shared_db):
+    async def main():
+        bot = Bot(asyncio.get_running_loop())
+        jobs = scheduler.Scheduler(bot)
+        await jobs.start()
+        assert list(jobs.jobs) == ["mine"]
+        jobs.jobs["theirs"] = dict(shared_db["theirs"])  # e.g. a stale copy
+        jobs._queue.put_nowait("theirs")
+        await asyncio.sleep(0.01)
+        for task in jobs._tasks:
+            task.cancel()
+
+    asyncio.run(main())
+    assert "theirs" in shared_db and "mine" not in shared_db  # "mine" was late, so it was dropped
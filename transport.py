@@ -0,0 +1,150 @@
+"""Record / replay of the game's responses, for profiling real command flows offline.
+
+`record_file` (config.json) appends every request and response of get_content (and login) to a gzipped JSONL file.
+`replay_file` serves the responses from such a file instead of the network.
+The requests are keyed by account too, so several accounts can replay the same pages.
+Passwords are never written to the file."""
+from asyncio import sleep
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import json
+import time
+
+
+def _redact(data):
+    if not isinstance(data, dict):
+        return data
+    return {k: "***" if "password" in str(k).lower() else v for k, v in data.items()}
+
+
+def request_key(account, method, link, data) -> str:
+    return f"{account} {method.upper()} {link} {json.dumps(_redact(data), sort_keys=True, default=str)}"
+
+
+class Response:
+    """The parts of aiohttp.ClientResponse that get_content uses"""
+    __slots__ = ("url", "status", "body")
+
+    def __init__(self, url, status, body):
+        self.url = url
+        self.status = status
+        self.body = body
+
+    async def text(self, encoding="utf-8"):
+        return self.body
+
+    async def json(self, content_type=None):
+        return json.loads(self.body)
+
+
+class _RecordedRequest:
+    def __init__(self, recorder, session, account, method, link, kwargs):
+        self.recorder = recorder
+        self.session = session
+        self.account = account
+        self.method = method
+        self.link = link
+        self.kwargs = kwargs
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        async with getattr(self.session, self.method)(self.link, **self.kwargs) as respond:
+            body = await respond.text(encoding="utf-8", errors="replace")
+            response = Response(respond.url, respond.status, body)
+        self.recorder.write(request_key(self.account, self.method, self.link, self.kwargs.get("data")), response,
+                            time.perf_counter() - start)
+        return response
+
+    async def __aexit__(self, *_):
+        return False
+
+
+class _RecordingSession:
+    def __init__(self, recorder, session, account):
+        self.recorder = recorder
+        self.session = session
+        self.account = account
+
+    def get(self, link, **kwargs):
+        return _RecordedRequest(self.recorder, self.session, self.account, "get", link, kwargs)
+
+    def post(self, link, **kwargs):
+        return _RecordedRequest(self.recorder, self.session, self.account, "post", link, kwargs)
+
+
+class Recorder:
+    """The compression and the writes run at a thread of their own (in order), not at the event loop"""
+
+    def __init__(self, filename):
+        self.file = gzip.open(filename, "at", encoding="utf-8")
+        self._writer = ThreadPoolExecutor(1)
+
+    def wrap(self, session, account=""):
+        return _RecordingSession(self, session, account)
+
+    def write(self, key, response, elapsed):
+        self._writer.submit(self._write, json.dumps({"key": key, "url": str(response.url), "status": response.status,
+                                                     "elapsed": round(elapsed, 4), "body": response.body}) + "\n")
+
+    def _write(self, line):
+        self.file.write(line)
+        self.file.flush()
+
+    def close(self):
+        self._writer.shutdown()
+        self.file.close()
+
+
+class _ReplayedRequest:
+    def __init__(self, replayer, account, method, link, data):
+        self.replayer = replayer
+        self.key = request_key(account, method, link, data)
+
+    async def __aenter__(self):
+        return await self.replayer.serve(self.key)
+
+    async def __aexit__(self, *_):
+        return False
+
+
+class _ReplaySession:
+    def __init__(self, replayer, account):
+        self.replayer = replayer
+        self.account = account
+
+    def get(self, link, **kwargs):
+        return _ReplayedRequest(self.replayer, self.account, "get", link, kwargs.get("data"))
+
+    def post(self, link, **kwargs):
+        return _ReplayedRequest(self.replayer, self.account, "post", link, kwargs.get("data"))
+
+
+class Replayer:
+    """Serves the recorded responses of each request in their original order (the last one repeats).
+    With `delay`, every response takes as long as it took when it was recorded."""
+
+    def __init__(self, filename, delay=False):
+        self.delay = delay
+        self.responses = defaultdict(list)
+        self.served = defaultdict(int)
+        with gzip.open(filename, "rt", encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                self.responses[record["key"]].append(record)
+
+    def wrap(self, _, account=""):
+        return _ReplaySession(self, account)
+
+    async def serve(self, key) -> Response:
+        records = self.responses.get(key)
+        if not records:
+            raise OSError(f"Not recorded: {key}")
+        record = records[min(self.served[key], len(records) - 1)]
+        self.served[key] += 1
+        if self.delay:
+            await sleep(record["elapsed"])
+        return Response(record["url"], record["status"], record["body"])
+
+    def close(self):
+        pass
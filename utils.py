@@ -1,40 +1,60 @@
-from asyncio import sleep
+from asyncio import get_event_loop, sleep
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import json
+from importlib.util import find_spec
 import os
 from random import randint
 
+import accounts
+from local_store import LocalStore
+from world_map import WorldMap
+
 client = None
+local_db = None
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")  # one thread = serialized writes
 
 
 def initiate_db():
-    global client
+    global client, local_db
+    client = None
     if "database_url" in os.environ:
-        try:
-            from motor.motor_asyncio import AsyncIOMotorClient
-            client = AsyncIOMotorClient(os.environ['database_url'])
-        except:
-            import subprocess
-            import sys
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "dnspython"])
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "motor"])
+        packages = {"motor": "motor"}
+        if os.environ['database_url'].startswith("mongodb+srv"):
+            packages["dnspython"] = "dns"
+        missing = [package for package, module in packages.items() if not find_spec(module)]
+        if not missing:
             from motor.motor_asyncio import AsyncIOMotorClient
             client = AsyncIOMotorClient(os.environ['database_url'])
-    else:
-        client = None
+            return
+        print(f"ERROR: `database_url` needs `pip install {' '.join(missing)}`. Using the local database meanwhile.")
+    if local_db is None:
+        local_db = LocalStore(os.environ.get("database_file", "database.db"))
+
 
+async def run_db(func, *args):
+    """Runs a blocking local db call without blocking the event loop"""
+    return await get_event_loop().run_in_executor(db_executor, func, *args)
 
-async def find(server: str, collection: str) -> list:
+
+async def find(server: str, collection: str, filter: dict = None, projection: list = None, sort: str = None,
+               batch_size: int = 50):
+    """Async iterator over the documents of a collection, fetched `batch_size` at a time.
+    `filter` = {field: value}, `projection` = [fields] (_id is always included), `sort` = field (ascending)"""
     if client is not None:
-        database = client[server][collection]
-        return await database.find().to_list(50)
+        cursor = client[server][collection].find(filter or {}, projection).batch_size(batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+        async for document in cursor:
+            yield document
     else:
-        filename = f"{server}_{collection}.json"
-        if filename in os.listdir():
-            with open(filename, "r") as file:
-                return [{**v, **{"_id": k}} for k, v in json.load(file).items()][:50]
-        else:
-            return list()
+        offset = 0
+        while True:
+            batch = await run_db(local_db.find, server, collection, filter, projection, sort, batch_size, offset)
+            for document in batch:
+                yield document
+            if len(batch) < batch_size:
+                break
+            offset += batch_size
 
 
 async def find_one(server: str, collection: str, ID: str) -> dict:
@@ -43,12 +63,7 @@ async def find_one(server: str, collection: str, ID: str) -> dict:
         database = client[server][collection]
         return await database.find_one({"_id": ID.lower()}, {"_id": 0}) or {}
     else:
-        filename = f"{server}_{collection}.json"
-        if filename in os.listdir():
-            with open(filename, "r") as file:
-                return json.load(file).get(ID.lower(), {})
-        else:
-            return dict()
+        return await run_db(local_db.find_one, server, collection, ID.lower())
 
 
 async def replace_one(server: str, collection: str, ID: str, data: dict) -> None:
@@ -57,15 +72,15 @@ async def replace_one(server: str, collection: str, ID: str, data: dict) -> None
         database = client[server][collection]
         await database.replace_one({'_id': ID.lower()}, data, True)
     else:
-        filename = f"{server}_{collection}.json"
-        if filename in os.listdir():
-            with open(filename, "r") as file:
-                big_dict = json.load(file)
-        else:
-            big_dict = dict()
-        big_dict[ID.lower()] = data
-        with open(filename, "w") as file:
-            json.dump(big_dict, file)
+        await run_db(local_db.replace_one, server, collection, ID.lower(), data)
+
+
+async def delete_one(server: str, collection: str, ID: str) -> None:
+    ID = ID.replace('"', "").replace("'", "")
+    if client is not None:
+        await client[server][collection].delete_one({'_id': ID.lower()})
+    else:
+        await run_db(local_db.delete_one, server, collection, ID.lower())
 
 
 def get_region_and_country_names(api_regions, api_countries, region_id):
@@ -82,12 +97,8 @@ async def is_helper(ctx=None):
 
 async def get_battle_id(bot, nick, server, battle_id, prioritize_my_country=True):
     URL = f"https://{server}.e-sim.org/"
-    apiCitizen = await bot.get_content(f"{URL}apiCitizenByName.html?name={nick.lower()}")
-    occupantId = 0
-    for row in await bot.get_content(f'{URL}apiMap.html'):
-        if row['regionId'] == apiCitizen['currentLocationRegionId']:
-            occupantId = row['occupantId']
-            break
+    apiCitizen = await bot.citizens.get(server, nick)
+    occupantId = (await world_map(bot, URL)).occupant.get(apiCitizen['currentLocationRegionId'], 0)
     try:
         if apiCitizen["level"] < 15:
             raise  # PRACTICE_BATTLE
@@ -135,27 +146,25 @@ async def random_sleep(restores_left=1):
 
 async def location(bot, nick, server):
     """getting current location"""
-    return (await bot.get_content(f"https://{server}.e-sim.org/apiCitizenByName.html?name={nick.lower()}")
-            )['currentLocationRegionId']
+    return (await bot.citizens.get(server, nick))['currentLocationRegionId']
+
+
+async def world_map(bot, URL: str) -> WorldMap:
+    """The world map index of the server, updated with the latest (cached) apiMap"""
+    server = URL.split("//", 1)[-1].split(".", 1)[0]
+    api_regions = await bot.get_content(f"{URL}apiRegions.html")
+    api_map = await bot.get_content(f'{URL}apiMap.html')
+    world = bot.world_maps.get(server)
+    if world is None or world.api_regions is not api_regions:
+        world = bot.world_maps[server] = WorldMap(api_regions)
+    world.update(api_map)
+    return world
 
 
 async def get_bonus_region(bot, URL: str, side: str, api_battles: dict) -> int:
-    if api_battles['type'] == "ATTACK":
-        if side == "attacker":
-            neighboursId = [z['neighbours'] for z in await bot.get_content(
-                f"{URL}apiRegions.html") if z["id"] == api_battles['regionId']][0]
-            api_map = await bot.get_content(f'{URL}apiMap.html')
-            aBonus = [i for z in api_map for i in neighboursId if
-                      i == z['regionId'] and z['occupantId'] == api_battles['attackerId']]
-            if not aBonus:
-                aBonus = [z['regionId'] for z in api_map if z['occupantId'] == api_battles['attackerId']]
-            return aBonus[0]
-        else:
-            return api_battles['regionId']
-    elif api_battles['type'] == "RESISTANCE":
-        return api_battles['regionId']
-    else:
+    if api_battles['type'] not in ("ATTACK", "RESISTANCE"):
         return 0
+    return (await world_map(bot, URL)).bonus_region(api_battles, side)
 
 
 def get_parameter(parameter_string) -> (float, str):
@@ -188,4 +197,5 @@ def get_parameter(parameter_string) -> (float, str):
 
 
 def my_nick(server):
-    return os.environ.get(server, os.environ['nick'])
+    """The nick of the current account (see accounts.py) at the given server"""
+    return accounts.current().nick_at(server)
@@ -0,0 +1,68 @@
+"""An index of the world map (apiRegions + apiMap), so the bonus region of a battle is a lookup instead of a scan
+of every region.
+
+The regions graph never changes during a game; the occupants do, so `update` only touches the regions that
+changed hands since the previous apiMap."""
+from collections import defaultdict, deque
+
+
+class WorldMap:
+    def __init__(self, api_regions, api_map=()):
+        self.api_regions = api_regions
+        self.neighbours = {region["id"]: tuple(region["neighbours"]) for region in api_regions}
+        self.home_country = {region["id"]: region.get("homeCountry", 0) for region in api_regions}
+        self.occupant = {}  # region: country
+        self.owned = defaultdict(set)  # country: regions
+        self.battles = {}  # region: battle id
+        self._api_map = None
+        self.update(api_map)
+
+    def update(self, api_map):
+        """Applies a newer apiMap (the same list object is skipped, so it's cheap to call with the cached one)"""
+        if api_map is self._api_map:
+            return
+        battles = {}
+        for row in api_map:
+            region, occupant = row["regionId"], row["occupantId"]
+            previous = self.occupant.get(region)
+            if previous != occupant:
+                if previous is not None:
+                    self.owned[previous].discard(region)
+                self.owned[occupant].add(region)
+                self.occupant[region] = occupant
+            if "battleId" in row:
+                battles[region] = row["battleId"]
+        self.battles = battles
+        self._api_map = api_map
+
+    def adjacent(self, region_id, country_id) -> list:
+        """The neighbours of `region_id` that `country_id` occupies"""
+        return [region for region in self.neighbours.get(region_id, ()) if self.occupant.get(region) == country_id]
+
+    def nearest(self, region_id, country_id) -> int:
+        """The closest region to `region_id` (by number of borders) that `country_id` occupies, or 0"""
+        if not self.owned.get(country_id):
+            return 0
+        seen = {region_id}
+        queue = deque([region_id])
+        while queue:
+            region = queue.popleft()
+            if self.occupant.get(region) == country_id:
+                return region
+            for neighbour in self.neighbours.get(region, ()):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+        return next(iter(self.owned[country_id]))  # not connected by land
+
+    def bonus_region(self, api_battles, side) -> int:
+        """Where to fight from in order to get the location bonus (0 = anywhere)"""
+        if api_battles["type"] == "ATTACK":
+            if side == "attacker":
+                region_id, attacker = api_battles["regionId"], api_battles["attackerId"]
+                neighbours = self.adjacent(region_id, attacker)
+                return neighbours[0] if neighbours else self.nearest(region_id, attacker)
+            return api_battles["regionId"]
+        elif api_battles["type"] == "RESISTANCE":
+            return api_battles["regionId"]
+        return 0